@@ -2,21 +2,29 @@ import os
 import logging
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.models.database import Base
+from sqlalchemy.pool import StaticPool
+from app.models.database import Base, json_serializer, json_deserializer
+
+# JSON columns are (de)serialized with orjson instead of the stdlib json module
+_JSON_OPTIONS = {
+    "json_serializer": json_serializer,
+    "json_deserializer": json_deserializer,
+}
 
 class DatabaseConfig:
-    def __init__(self, database_url: str = None):
+    def __init__(self, database_url: str = None, pool_size: int = None, max_overflow: int = None):
         # Use environment variable or default to SQLite for development
         self.database_url = database_url or os.getenv(
             "DATABASE_URL", 
             "sqlite:///./jarvis_memory.db"
         )
         
+        # Connection pool limits for server databases, shared by the app and ADK sessions
+        self.pool_size = pool_size or int(os.getenv("DATABASE_POOL_SIZE", "20"))
+        self.max_overflow = max_overflow if max_overflow is not None else int(os.getenv("DATABASE_MAX_OVERFLOW", "40"))
+        
         # Create synchronous engine first (always works)
-        self.engine = create_engine(
-            self.database_url,
-            connect_args={"check_same_thread": False} if "sqlite" in self.database_url else {}
-        )
+        self.engine = create_engine(self.database_url, **self._engine_options())
         
         # Create session maker
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
@@ -36,6 +44,25 @@ class DatabaseConfig:
         
         logging.info(f"Database configured with URL: {self.database_url}")
         
+    def _engine_options(self) -> dict:
+        """Connection pool and JSON column settings for the configured database"""
+        if "sqlite" in self.database_url:
+            options = {"connect_args": {"check_same_thread": False}, **_JSON_OPTIONS}
+            # An in-memory database only exists on a single connection
+            if ":memory:" in self.database_url or self.database_url.rstrip("/") == "sqlite:":
+                options["poolclass"] = StaticPool
+            return options
+
+        # Keep a warm pool for concurrent requests, and detect connections
+        # dropped by Cloud SQL before handing them out
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+            **_JSON_OPTIONS,
+        }
+        
     def _setup_async_engine(self):
         """Set up async engine if dependencies are available"""
         try:
@@ -48,7 +75,8 @@ class DatabaseConfig:
                 self.async_database_url = self.database_url.replace("postgresql://", "postgresql+asyncpg://")
             
             # Create async engine
-            self.async_engine = create_async_engine(self.async_database_url)
+            async_options = dict(_JSON_OPTIONS) if "sqlite" in self.database_url else self._engine_options()
+            self.async_engine = create_async_engine(self.async_database_url, **async_options)
             
             # Create async session maker
             self.AsyncSessionLocal = sessionmaker(
@@ -73,6 +101,13 @@ class DatabaseConfig:
         """Create all database tables"""
         try:
             Base.metadata.create_all(bind=self.engine)
+
+            # create_all skips tables that already exist, so add any indexes
+            # introduced after those tables were first created
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=self.engine, checkfirst=True)
+
             logging.info("Database tables created successfully")
         except Exception as e:
             logging.error(f"Error creating database tables: {e}")
@@ -237,6 +237,7 @@ You can interact with YouTube data:
 - Get detailed video information
 - Retrieve channel details
 - Get video comments and engagement metrics
+- Search and fetch video details and comments together in a single call (search_and_hydrate)
 - Support various search filters:
   * Relevance
   * View count
@@ -1,5 +1,5 @@
 import asyncio
-import json
+import orjson
 import logging
 import os
 import sys
@@ -183,7 +183,7 @@ async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextConten
             logging.info(
                 f"MCP Server: ADK tool '{name}' executed. Response: {adk_tool_response}"
             )
-            response_text = json.dumps(adk_tool_response, indent=2)
+            response_text = orjson.dumps(adk_tool_response, option=orjson.OPT_NON_STR_KEYS).decode()
             return [mcp_types.TextContent(type="text", text=response_text)]
 
         except Exception as e:
@@ -194,7 +194,7 @@ async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextConten
                 "success": False,
                 "message": f"Failed to execute tool '{name}': {str(e)}",
             }
-            error_text = json.dumps(error_payload)
+            error_text = orjson.dumps(error_payload).decode()
             return [mcp_types.TextContent(type="text", text=error_text)]
     else:
         logging.warning(f"MCP Server: Tool '{name}' not found/exposed by this server.")
@@ -202,7 +202,7 @@ async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextConten
             "success": False,
             "message": f"Tool '{name}' not implemented by this server.",
         }
-        error_text = json.dumps(error_payload)
+        error_text = orjson.dumps(error_payload).decode()
         return [mcp_types.TextContent(type="text", text=error_text)]
 
 # --- MCP Server Runner ---
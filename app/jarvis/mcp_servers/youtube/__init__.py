@@ -6,4 +6,5 @@ This package provides functionality to:
 - Get video details
 - Get channel information
 - Get video comments
+- Search videos and fetch their details and comments in one call
 """ 
\ No newline at end of file
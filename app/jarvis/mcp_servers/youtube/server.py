@@ -1,10 +1,15 @@
 import asyncio
+import atexit
+import functools
 import json
+import orjson
 import logging
 import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 
 # Add the root directory to Python path for imports
 root_dir = str(Path(__file__).resolve().parents[4])
@@ -18,16 +23,13 @@ from app.config.logging_config import setup_cloud_logging
 # Setup cloud logging
 setup_cloud_logging()
 
-# YouTube API imports
-from google.auth.transport.requests import Request
+# YouTube API imports (discovery, OAuth flow and ADK imports are deferred to first use
+# so short-lived stdio server processes start quickly)
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-# ADK Tool Imports
-from google.adk.tools.function_tool import FunctionTool
-from google.adk.tools.mcp_tool.conversion_utils import adk_to_mcp_tool_type
+if TYPE_CHECKING:
+    from google.adk.tools.function_tool import FunctionTool
 
 # MCP Server Imports
 from mcp import types as mcp_types
@@ -38,12 +40,18 @@ from mcp.server.models import InitializationOptions
 load_environment()
 
 # --- Logging Setup ---
+# Records are handed to a queue and written to the log file by a background
+# listener thread, so tool calls never block on disk I/O
 LOG_FILE_PATH = os.path.join(os.path.dirname(__file__), "mcp_server_activity.log")
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, logging.FileHandler(LOG_FILE_PATH, mode="w"))
+log_listener.start()
+atexit.register(log_listener.stop)
 logging.basicConfig(
     level=logging.DEBUG,
     format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s",
     handlers=[
-        logging.FileHandler(LOG_FILE_PATH, mode="w"),
+        QueueHandler(log_queue),
     ],
 )
 
@@ -57,6 +65,40 @@ SCOPES = [
 # Get paths from environment utility
 TOKEN_PATH = Path(os.path.expanduser("~/.credentials/youtube_token.json"))
 
+# Credentials are kept in memory and only re-read from TOKEN_PATH when they are
+# missing or invalid and the token file has changed since it was last loaded
+_credentials = None
+_token_mtime = None
+
+def _load_token_credentials():
+    """
+    Load credentials from TOKEN_PATH, reusing the cached ones if the file is unchanged.
+
+    Returns:
+        Credentials or None if the token file is missing or unreadable
+    """
+    global _credentials, _token_mtime
+
+    try:
+        mtime = TOKEN_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+    if _credentials is not None and mtime == _token_mtime:
+        return _credentials
+
+    try:
+        _credentials = Credentials.from_authorized_user_info(
+            json.loads(TOKEN_PATH.read_bytes()), SCOPES
+        )
+        _token_mtime = mtime
+        logging.debug("Successfully loaded existing credentials")
+        return _credentials
+    except Exception as e:
+        logging.warning(f"Failed to load existing credentials: {e}", exc_info=True)
+        # If token is corrupted or invalid, we'll create new credentials
+        return None
+
 def get_youtube_service():
     """
     Authenticate and create a YouTube service object.
@@ -64,24 +106,18 @@ def get_youtube_service():
     Returns:
         A YouTube service object or None if authentication fails
     """
-    creds = None
+    global _credentials, _token_mtime
 
-    # Check if token exists and is valid
-    if TOKEN_PATH.exists():
-        try:
-            creds = Credentials.from_authorized_user_info(
-                json.loads(TOKEN_PATH.read_text()), SCOPES
-            )
-            logging.debug("Successfully loaded existing credentials")
-        except Exception as e:
-            logging.warning(f"Failed to load existing credentials: {e}", exc_info=True)
-            # If token is corrupted or invalid, we'll create new credentials
-            pass
+    # Only touch the token file when the cached credentials can't be used
+    creds = _credentials
+    if not creds or not creds.valid:
+        creds = _load_token_credentials()
 
     # If credentials don't exist or are invalid, refresh or get new ones
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             try:
+                from google.auth.transport.requests import Request
                 creds.refresh(Request())
                 logging.info("Successfully refreshed expired credentials")
             except Exception as e:
@@ -95,6 +131,7 @@ def get_youtube_service():
                 return None
 
             try:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_config(creds_info, SCOPES)
                 creds = flow.run_local_server(port=0)
                 logging.info("Successfully created new credentials through OAuth flow")
@@ -106,12 +143,15 @@ def get_youtube_service():
         try:
             TOKEN_PATH.parent.mkdir(parents=True, exist_ok=True)
             TOKEN_PATH.write_text(creds.to_json())
-            logging.debug(f"Saved credentials to {TOKEN_PATH}")
+            _token_mtime = TOKEN_PATH.stat().st_mtime
+            logging.debug("Saved credentials to %s", TOKEN_PATH)
         except Exception as e:
             logging.warning(f"Failed to save credentials: {e}", exc_info=True)
+        _credentials = creds
 
     # Create and return the YouTube service
     try:
+        from googleapiclient.discovery import build
         service = build("youtube", "v3", credentials=creds)
         logging.debug("Successfully created YouTube service")
         return service
@@ -119,6 +159,37 @@ def get_youtube_service():
         logging.error(f"Failed to create YouTube service: {e}", exc_info=True)
         return None
 
+# Maximum number of YouTube API requests a composite tool keeps in flight
+MAX_CONCURRENT_REQUESTS = 5
+
+def _format_video_details(video: dict) -> dict:
+    """Flatten a videos.list item into the shape returned by the tools."""
+    return {
+        "id": video["id"],
+        "title": video["snippet"]["title"],
+        "description": video["snippet"]["description"],
+        "published_at": video["snippet"]["publishedAt"],
+        "channel_title": video["snippet"]["channelTitle"],
+        "thumbnails": video["snippet"]["thumbnails"],
+        "duration": video["contentDetails"]["duration"],
+        "view_count": video["statistics"].get("viewCount", "0"),
+        "like_count": video["statistics"].get("likeCount", "0"),
+        "comment_count": video["statistics"].get("commentCount", "0")
+    }
+
+def _list_video_details(video_ids: List[str]) -> List[dict]:
+    """Fetch details for several videos with a single videos.list call."""
+    service = get_youtube_service()
+    if not service:
+        raise RuntimeError("Failed to authenticate with YouTube API.")
+
+    video_response = service.videos().list(
+        part="snippet,contentDetails,statistics",
+        id=",".join(video_ids)
+    ).execute()
+
+    return [_format_video_details(video) for video in video_response.get("items", [])]
+
 # --- MCP Tool Functions ---
 def search_videos(
     query: str,
@@ -219,19 +290,7 @@ def get_video_details(
                 "message": f"Video {video_id} not found."
             }
 
-        video = video_response["items"][0]
-        video_details = {
-            "id": video["id"],
-            "title": video["snippet"]["title"],
-            "description": video["snippet"]["description"],
-            "published_at": video["snippet"]["publishedAt"],
-            "channel_title": video["snippet"]["channelTitle"],
-            "thumbnails": video["snippet"]["thumbnails"],
-            "duration": video["contentDetails"]["duration"],
-            "view_count": video["statistics"].get("viewCount", "0"),
-            "like_count": video["statistics"].get("likeCount", "0"),
-            "comment_count": video["statistics"].get("commentCount", "0")
-        }
+        video_details = _format_video_details(video_response["items"][0])
 
         return {
             "status": "success",
@@ -381,30 +440,104 @@ def get_video_comments(
             "comments": []
         }
 
+async def search_and_hydrate(
+    query: str,
+    max_results: int = 5,
+    max_comments: int = 5
+) -> dict:
+    """
+    Search for YouTube videos and fetch their details and top comments in one call.
+
+    The details lookup and the per-video comment lookups are issued concurrently.
+
+    Args:
+        query (str): Search query
+        max_results (int): Maximum number of videos to return (default: 5)
+        max_comments (int): Maximum number of comments per video (default: 5)
+
+    Returns:
+        dict: Videos with details and comments, or error details
+    """
+    try:
+        search_result = await asyncio.to_thread(search_videos, query, max_results)
+        if search_result["status"] != "success" or not search_result["videos"]:
+            return search_result
+
+        video_ids = [video["id"] for video in search_result["videos"]]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def _bounded(func, *args):
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
+
+        details, comments = await asyncio.gather(
+            _bounded(_list_video_details, video_ids),
+            asyncio.gather(*(
+                _bounded(get_video_comments, video_id, max_comments)
+                for video_id in video_ids
+            ))
+        )
+
+        details_by_id = {video["id"]: video for video in details}
+        videos = []
+        for video, video_comments in zip(search_result["videos"], comments):
+            hydrated = details_by_id.get(video["id"], video)
+            hydrated["comments"] = video_comments.get("comments", [])
+            videos.append(hydrated)
+
+        return {
+            "status": "success",
+            "message": f"Found {len(videos)} videos",
+            "videos": videos
+        }
+
+    except HttpError as e:
+        logging.error(f"YouTube API error: {str(e)}", exc_info=True)
+        return {
+            "status": "error",
+            "message": f"YouTube API error: {str(e)}",
+            "videos": []
+        }
+    except Exception as e:
+        logging.error(f"Error searching and hydrating videos: {str(e)}", exc_info=True)
+        return {
+            "status": "error",
+            "message": f"Error searching and hydrating videos: {str(e)}",
+            "videos": []
+        }
+
 # --- MCP Server Setup ---
 logging.info("Creating MCP Server instance for YouTube...")
 app = Server("youtube-mcp-server")
 
-# Wrap YouTube utility functions as ADK FunctionTools
-ADK_YOUTUBE_TOOLS = {
-    "search_videos": FunctionTool(func=search_videos),
-    "get_video_details": FunctionTool(func=get_video_details),
-    "get_channel_info": FunctionTool(func=get_channel_info),
-    "get_video_comments": FunctionTool(func=get_video_comments)
-}
+@functools.cache
+def get_adk_youtube_tools() -> Dict[str, "FunctionTool"]:
+    """Wrap YouTube utility functions as ADK FunctionTools on first use."""
+    from google.adk.tools.function_tool import FunctionTool
+
+    return {
+        "search_videos": FunctionTool(func=search_videos),
+        "get_video_details": FunctionTool(func=get_video_details),
+        "get_channel_info": FunctionTool(func=get_channel_info),
+        "get_video_comments": FunctionTool(func=get_video_comments),
+        "search_and_hydrate": FunctionTool(func=search_and_hydrate)
+    }
 
 @app.list_tools()
 async def list_mcp_tools() -> list[mcp_types.Tool]:
     """MCP handler to list tools this server exposes."""
+    from google.adk.tools.mcp_tool.conversion_utils import adk_to_mcp_tool_type
+
     logging.info("MCP Server: Received list_tools request.")
     mcp_tools_list = []
-    for tool_name, adk_tool_instance in ADK_YOUTUBE_TOOLS.items():
+    for tool_name, adk_tool_instance in get_adk_youtube_tools().items():
         if not adk_tool_instance.name:
             adk_tool_instance.name = tool_name
 
         mcp_tool_schema = adk_to_mcp_tool_type(adk_tool_instance)
         logging.info(
-            f"MCP Server: Advertising tool: {mcp_tool_schema.name}, InputSchema: {mcp_tool_schema.inputSchema}"
+            "MCP Server: Advertising tool: %s, InputSchema: %s",
+            mcp_tool_schema.name, mcp_tool_schema.inputSchema
         )
         mcp_tools_list.append(mcp_tool_schema)
     return mcp_tools_list
@@ -413,20 +546,21 @@ async def list_mcp_tools() -> list[mcp_types.Tool]:
 async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextContent]:
     """MCP handler to execute a tool call requested by an MCP client."""
     logging.info(
-        f"MCP Server: Received call_tool request for '{name}' with args: {arguments}"
+        "MCP Server: Received call_tool request for '%s' with args: %s", name, arguments
     )
 
-    if name in ADK_YOUTUBE_TOOLS:
-        adk_tool_instance = ADK_YOUTUBE_TOOLS[name]
+    adk_youtube_tools = get_adk_youtube_tools()
+    if name in adk_youtube_tools:
+        adk_tool_instance = adk_youtube_tools[name]
         try:
             adk_tool_response = await adk_tool_instance.run_async(
                 args=arguments,
                 tool_context=None,  # type: ignore
             )
             logging.info(
-                f"MCP Server: ADK tool '{name}' executed. Response: {adk_tool_response}"
+                "MCP Server: ADK tool '%s' executed. Response: %s", name, adk_tool_response
             )
-            response_text = json.dumps(adk_tool_response, indent=2)
+            response_text = orjson.dumps(adk_tool_response, option=orjson.OPT_NON_STR_KEYS).decode()
             return [mcp_types.TextContent(type="text", text=response_text)]
 
         except Exception as e:
@@ -437,7 +571,7 @@ async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextConten
                 "success": False,
                 "message": f"Failed to execute tool '{name}': {str(e)}",
             }
-            error_text = json.dumps(error_payload)
+            error_text = orjson.dumps(error_payload).decode()
             return [mcp_types.TextContent(type="text", text=error_text)]
     else:
         logging.warning(f"MCP Server: Tool '{name}' not found/exposed by this server.")
@@ -445,7 +579,7 @@ async def call_mcp_tool(name: str, arguments: dict) -> list[mcp_types.TextConten
             "success": False,
             "message": f"Tool '{name}' not implemented by this server.",
         }
-        error_text = json.dumps(error_payload)
+        error_text = orjson.dumps(error_payload).decode()
         return [mcp_types.TextContent(type="text", text=error_text)]
 
 # --- MCP Server Runner ---
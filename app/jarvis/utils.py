@@ -3,18 +3,22 @@ Utility functions.
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
 import json
 from typing import Optional, Dict, List, Tuple
 import datetime
-from pytz import timezone
+from zoneinfo import ZoneInfo
+
+# Resolved once; ZoneInfo is C-backed and avoids pytz's per-call lookup
+_IST = ZoneInfo("Asia/Kolkata")
 
 def get_current_time() -> dict:
     """
     Get the current time and date in IST timezone
     """
     # Get current time in IST 
-    now = datetime.datetime.now(timezone('Asia/Kolkata'))
+    now = datetime.datetime.now(_IST)
 
     # Format date as MM-DD-YYYY
     formatted_date = now.strftime("%m-%d-%Y")
@@ -24,24 +28,28 @@ def get_current_time() -> dict:
         "formatted_date": formatted_date,
     }
 
+@lru_cache(maxsize=1)
 def is_cloud_run() -> bool:
     """Check if we're running in Cloud Run"""
     return bool(os.environ.get("K_SERVICE"))
 
+@lru_cache(maxsize=1)
 def get_credentials_path() -> Path:
     """Get the appropriate path for credentials.json"""
     if is_cloud_run():
         return Path("/app/credentials.json")
     return Path("credentials.json")
 
+@lru_cache(maxsize=1)
 def get_token_path() -> Path:
     """Get the appropriate path for token storage"""
     if is_cloud_run():
         return Path("/tmp/calendar_token.json")
     return Path(os.path.expanduser("~/.credentials/calendar_token.json"))
 
+@lru_cache(maxsize=1)
 def get_google_credentials() -> Optional[dict]:
-    """Get Google Calendar credentials from environment or file"""
+    """Get Google Calendar credentials from environment or file (read once per process)"""
     # First try environment variable (Cloud Run)
     creds_json = os.environ.get("GOOGLE_CREDENTIALS")
     if creds_json:
@@ -65,6 +73,7 @@ def get_google_credentials() -> Optional[dict]:
 
     return None
 
+@lru_cache(maxsize=1)
 def get_twitter_credentials() -> Dict[str, str]:
     """
     Get Twitter API credentials from environment variables.
@@ -19,11 +19,12 @@ if __name__ == "__main__":
     # Get port from environment or default to 8000
     port = int(os.environ.get("PORT", 8000))
 
-    # Run the FastAPI app with uvicorn
+    # Run the FastAPI app with uvicorn (uvloop/httptools are picked up automatically when installed)
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,  # Enable auto-reload for development
-        log_level="info",
+        reload=os.environ.get("DEV") == "1",  # Auto-reload only for local development
+        log_level=os.environ.get("LOG_LEVEL", "warning"),
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
     )
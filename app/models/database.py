@@ -1,64 +1,181 @@
-from sqlalchemy import create_engine, Column, String, DateTime, JSON, Text, ForeignKey, Integer, Float, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-from datetime import datetime
-import uuid
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional
+import orjson
+from sqlalchemy import String, DateTime, JSON, Text, ForeignKey, Integer, Float, Boolean, Index, Table, Column, select, func, insert, literal, inspect, table, column
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, Session
+from sqlalchemy.sql.functions import FunctionElement
+from datetime import datetime, timezone
 
-Base = declarative_base()
+# JSON everywhere, JSONB on Postgres so GIN indexes can be added on JSON columns
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+# JSON object column that flushes in-place changes like row.column[key] = value.
+# as_mutable() applies to every column sharing the type instance it is given,
+# so this needs its own instance rather than JSONType.
+MutableJSONDict = MutableDict.as_mutable(JSON().with_variant(JSONB(), "postgresql"))
+
+def json_serializer(value: Any) -> str:
+    """orjson-backed serializer for JSON columns, passed to create_engine.
+
+    Values orjson can't encode natively are stored as their str().
+    """
+    return orjson.dumps(
+        value,
+        default=str,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    ).decode()
+
+def json_deserializer(value: Any) -> Any:
+    """orjson-backed deserializer for JSON columns, passed to create_engine.
+
+    SQLite gives JSON columns numeric affinity, so scalar numbers come back
+    already converted rather than as JSON text.
+    """
+    if isinstance(value, (int, float)):
+        return value
+    return orjson.loads(value)
+
+class Base(DeclarativeBase):
+    pass
+
+class new_uuid(FunctionElement):
+    """Random UUID string generated by the database rather than in Python."""
+    type = String()
+    inherit_cache = True
+
+@compiles(new_uuid)
+def _compile_new_uuid(element, compiler, **kw):
+    return "uuid()"
+
+@compiles(new_uuid, "postgresql")
+def _compile_new_uuid_postgresql(element, compiler, **kw):
+    return "gen_random_uuid()::text"
+
+@compiles(new_uuid, "sqlite")
+def _compile_new_uuid_sqlite(element, compiler, **kw):
+    return "lower(hex(randomblob(16)))"
+
+class json_merge(FunctionElement):
+    """JSON column with the keys of a JSON object merged in, computed by the database
+    so an UPDATE can send just the new keys instead of reading and rewriting the column.
+
+    Postgres replaces top-level keys; SQLite and MySQL apply the object as a JSON
+    merge patch, which also merges nested objects.
+    """
+    type = JSONType
+    inherit_cache = True
+
+    def __init__(self, column, value: Dict[str, Any]):
+        super().__init__(column, literal(value, JSONType))
+
+@compiles(json_merge)
+def _compile_json_merge(element, compiler, **kw):
+    column, value = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"JSON_MERGE_PATCH(coalesce({column}, '{{}}'), {value})"
+
+@compiles(json_merge, "postgresql")
+def _compile_json_merge_postgresql(element, compiler, **kw):
+    column, value = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"coalesce({column}, '{{}}'::jsonb) || {value}"
+
+@compiles(json_merge, "sqlite")
+def _compile_json_merge_sqlite(element, compiler, **kw):
+    column, value = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"json_patch(coalesce({column}, '{{}}'), {value})"
+
+class Tag(Base):
+    __tablename__ = 'tags'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String, unique=True, index=True)
+
+memory_tags = Table(
+    'memory_tags',
+    Base.metadata,
+    Column('memory_id', ForeignKey('memory_vectors.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True, index=True),
+)
+
+life_event_tags = Table(
+    'life_event_tags',
+    Base.metadata,
+    Column('life_event_id', ForeignKey('life_events.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True, index=True),
+)
+
+def _insert_ignoring_conflicts(session: Session, target: Table):
+    """INSERT into target that skips rows clashing with an existing unique key."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(target).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(target).on_conflict_do_nothing()
+    return insert(target).prefix_with("IGNORE")
+
+def get_or_create_tags(session: Session, names: Iterable[str]) -> List[Tag]:
+    """Return Tag rows for the given names, creating any that don't exist yet.
+
+    Missing tags are inserted with conflicts ignored, so concurrent writers adding
+    the same new tag can't trip the unique constraint on Tag.name.
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return []
+
+    session.execute(_insert_ignoring_conflicts(session, Tag.__table__), [{"name": name} for name in names])
+    existing = {
+        tag.name: tag
+        for tag in session.scalars(select(Tag).where(Tag.name.in_(names)))
+    }
+    return [existing[name] for name in names]
+
+def utc_now() -> datetime:
+    """Current time as an aware UTC datetime, for timezone-aware timestamp columns."""
+    return datetime.now(timezone.utc)
+
+# Timestamps keep a Python default alongside the server default: create_all never
+# alters existing tables, so those created before the server defaults have none
 
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
-    
-    user_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    preferences = Column(JSON, default=dict)
-    interaction_stats = Column(JSON, default=dict)
-    communication_style = Column(JSON, default=dict)
-    
-    sessions = relationship("SessionHistory", back_populates="user")
-    preferences_records = relationship("UserPreference", back_populates="user")
-    life_events = relationship("LifeEvent", back_populates="user")
-
-def _ensure_json_serializable(obj):
-    """Recursively convert a dictionary to ensure all values are JSON serializable."""
-    if isinstance(obj, dict):
-        return {key: _ensure_json_serializable(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [_ensure_json_serializable(item) for item in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    elif isinstance(obj, (str, int, float, bool, type(None))):
-        return obj
-    else:
-        return str(obj)
+
+    user_id: Mapped[str] = mapped_column(String, primary_key=True, server_default=new_uuid())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now(), onupdate=func.now())
+    preferences: Mapped[Optional[dict]] = mapped_column(MutableJSONDict, default=dict)
+    interaction_stats: Mapped[Optional[dict]] = mapped_column(MutableJSONDict, default=dict)
+    communication_style: Mapped[Optional[dict]] = mapped_column(MutableJSONDict, default=dict)
+
+    # Collections are never lazy loaded: queries that need them must attach
+    # selectinload() so a profile walk can't turn into one SELECT per row
+    sessions: Mapped[List["SessionHistory"]] = relationship(back_populates="user", lazy="raise_on_sql")
+    preferences_records: Mapped[List["UserPreference"]] = relationship(back_populates="user", lazy="raise_on_sql")
+    life_events: Mapped[List["LifeEvent"]] = relationship(back_populates="user", lazy="raise_on_sql")
 
 class SessionHistory(Base):
     __tablename__ = 'session_history'
-    
-    session_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey('user_profiles.user_id'))
-    created_at = Column(DateTime, default=datetime.utcnow)
-    ended_at = Column(DateTime, nullable=True)
-    session_summary = Column(Text)
-    topics_discussed = Column(JSON, default=list)
-    outcomes = Column(JSON, default=dict)
-    session_metadata = Column(JSON, default=dict)
-    is_active = Column(Boolean, default=True)
-    
-    user = relationship("UserProfile", back_populates="sessions")
-    interactions = relationship("SessionInteraction", back_populates="session")
-    
-    def __init__(self, **kwargs):
-        """Initialize with JSON serializable data"""
-        if 'session_metadata' in kwargs:
-            kwargs['session_metadata'] = _ensure_json_serializable(kwargs['session_metadata'])
-        if 'topics_discussed' in kwargs:
-            kwargs['topics_discussed'] = _ensure_json_serializable(kwargs['topics_discussed'])
-        if 'outcomes' in kwargs:
-            kwargs['outcomes'] = _ensure_json_serializable(kwargs['outcomes'])
-        super().__init__(**kwargs)
-    
+    __table_args__ = (
+        # Active-session scans filter on is_active, then user
+        Index('ix_session_active', 'is_active', 'user_id'),
+    )
+
+    session_id: Mapped[str] = mapped_column(String, primary_key=True, server_default=new_uuid())
+    user_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('user_profiles.user_id'), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    session_summary: Mapped[Optional[str]] = mapped_column(Text)
+    topics_discussed: Mapped[Optional[list]] = mapped_column(JSONType, default=list)
+    outcomes: Mapped[Optional[Any]] = mapped_column(JSONType, default=dict)
+    session_metadata: Mapped[Optional[dict]] = mapped_column(JSONType, default=dict)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+
+    user: Mapped[Optional["UserProfile"]] = relationship(back_populates="sessions")
+    interactions: Mapped[List["SessionInteraction"]] = relationship(back_populates="session", lazy="raise_on_sql")
+
     def to_dict(self):
         """Convert to dictionary with JSON-safe values"""
         return {
@@ -75,57 +192,119 @@ class SessionHistory(Base):
 
 class SessionInteraction(Base):
     __tablename__ = 'session_interactions'
-    
-    id = Column(Integer, primary_key=True)
-    session_id = Column(String, ForeignKey('session_history.session_id'))
-    user_input = Column(Text)
-    agent_response = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    tools_used = Column(JSON, default=list)
-    context_data = Column(JSON, default=dict)
-    
-    session = relationship("SessionHistory", back_populates="interactions")
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    session_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('session_history.session_id'), index=True)
+    user_input: Mapped[Optional[str]] = mapped_column(Text)
+    agent_response: Mapped[Optional[str]] = mapped_column(Text)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    tools_used: Mapped[Optional[list]] = mapped_column(JSONType, default=list)
+    context_data: Mapped[Optional[dict]] = mapped_column(JSONType, default=dict)
+
+    session: Mapped[Optional["SessionHistory"]] = relationship(back_populates="interactions")
+
+def bulk_log_interactions(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """Insert SessionInteraction rows in a single executemany instead of one ORM add per row.
+
+    Rows are dicts keyed by SessionInteraction attribute names; ids are filled in by
+    the database, and timestamps default to now when a row doesn't carry one.
+    The caller owns the transaction and commits.
+    """
+    if rows:
+        session.execute(insert(SessionInteraction), rows)
 
 class UserPreference(Base):
     __tablename__ = 'user_preferences'
-    
-    id = Column(Integer, primary_key=True)
-    user_id = Column(String, ForeignKey('user_profiles.user_id'))
-    preference_key = Column(String)
-    preference_value = Column(JSON)
-    confidence_score = Column(Float, default=0.5)
-    last_reinforced = Column(DateTime, default=datetime.utcnow)
-    preference_type = Column(String)  # 'explicit', 'implicit', 'inferred'
-    preference_category = Column(String)  # 'communication', 'functionality', 'personal', etc.
-    
-    user = relationship("UserProfile", back_populates="preferences_records")
+    __table_args__ = (
+        # update_preference looks preferences up by (user, key); also serves user-only lookups
+        Index('ix_pref_user_key', 'user_id', 'preference_key'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('user_profiles.user_id'))
+    preference_key: Mapped[Optional[str]] = mapped_column(String, index=True)
+    preference_value: Mapped[Optional[Any]] = mapped_column(JSONType)
+    confidence_score: Mapped[Optional[float]] = mapped_column(Float, default=0.5)
+    last_reinforced: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    preference_type: Mapped[Optional[str]] = mapped_column(String)  # 'explicit', 'implicit', 'inferred'
+    preference_category: Mapped[Optional[str]] = mapped_column(String)  # 'communication', 'functionality', 'personal', etc.
+
+    user: Mapped[Optional["UserProfile"]] = relationship(back_populates="preferences_records")
 
 class LifeEvent(Base):
     __tablename__ = 'life_events'
-    
-    id = Column(Integer, primary_key=True)
-    user_id = Column(String, ForeignKey('user_profiles.user_id'))
-    event_type = Column(String)  # 'recurring', 'significant', 'milestone'
-    event_data = Column(JSON)
-    event_date = Column(DateTime)
-    importance_score = Column(Float, default=0.5)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    tags = Column(JSON, default=list)
-    
-    user = relationship("UserProfile", back_populates="life_events")
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('user_profiles.user_id'), index=True)
+    event_type: Mapped[Optional[str]] = mapped_column(String)  # 'recurring', 'significant', 'milestone'
+    event_data: Mapped[Optional[dict]] = mapped_column(JSONType)
+    event_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), index=True)
+    importance_score: Mapped[Optional[float]] = mapped_column(Float, default=0.5)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+
+    user: Mapped[Optional["UserProfile"]] = relationship(back_populates="life_events")
+    tags: Mapped[List["Tag"]] = relationship(secondary=life_event_tags)
 
 class MemoryVector(Base):
     __tablename__ = 'memory_vectors'
-    
-    id = Column(Integer, primary_key=True)
-    user_id = Column(String, ForeignKey('user_profiles.user_id'))
-    session_id = Column(String, ForeignKey('session_history.session_id'), nullable=True)
-    content = Column(Text)
-    content_summary = Column(Text)
-    vector_id = Column(String)  # ID in vector database
-    memory_type = Column(String)  # 'conversation', 'preference', 'fact', 'experience'
-    importance_score = Column(Float, default=0.5)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_accessed = Column(DateTime, default=datetime.utcnow)
-    access_count = Column(Integer, default=0)
-    tags = Column(JSON, default=list) 
\ No newline at end of file
+    __table_args__ = (
+        # "memories of type X for user Y" is the dominant lookup
+        Index('ix_memory_user_type', 'user_id', 'memory_type'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('user_profiles.user_id'), index=True)
+    session_id: Mapped[Optional[str]] = mapped_column(String, ForeignKey('session_history.session_id'), nullable=True, index=True)
+    content: Mapped[Optional[str]] = mapped_column(Text)
+    content_summary: Mapped[Optional[str]] = mapped_column(Text)
+    vector_id: Mapped[Optional[str]] = mapped_column(String)  # ID in vector database
+    memory_type: Mapped[Optional[str]] = mapped_column(String, index=True)  # 'conversation', 'preference', 'fact', 'experience'
+    importance_score: Mapped[Optional[float]] = mapped_column(Float, default=0.5)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    last_accessed: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utc_now, server_default=func.now())
+    access_count: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+
+    tags: Mapped[List["Tag"]] = relationship(secondary=memory_tags)
+
+def _legacy_tag_names(value: Any) -> List[str]:
+    """Tag names from a legacy JSON tags value, stored as a list or a comma-separated string."""
+    if isinstance(value, str):
+        return value.split(",")
+    if isinstance(value, list):
+        return [str(name) for name in value]
+    return []
+
+def backfill_legacy_tags(session: Session) -> int:
+    """Link tags stored in the legacy JSON tags columns through the tag link tables.
+
+    Tables created before the link tables still carry a tags column that the models
+    no longer map. Safe to run again; returns the number of links written.
+    """
+    columns = {
+        table_name: {col["name"] for col in inspect(session.connection()).get_columns(table_name)}
+        for table_name in (MemoryVector.__tablename__, LifeEvent.__tablename__)
+    }
+    linked = 0
+    for model, link_table, link_column in (
+        (MemoryVector, memory_tags, "memory_id"),
+        (LifeEvent, life_event_tags, "life_event_id"),
+    ):
+        if "tags" not in columns[model.__tablename__]:
+            continue
+
+        legacy = table(model.__tablename__, column("id", Integer), column("tags", JSONType))
+        tag_names = {
+            row.id: list(dict.fromkeys(name.strip() for name in _legacy_tag_names(row.tags) if name.strip()))
+            for row in session.execute(select(legacy.c.id, legacy.c.tags).where(legacy.c.tags.is_not(None)))
+        }
+        tag_ids = {tag.name: tag.id for tag in get_or_create_tags(session, chain.from_iterable(tag_names.values()))}
+        links = [
+            {link_column: row_id, "tag_id": tag_ids[name]}
+            for row_id, names in tag_names.items()
+            for name in names
+        ]
+        if links:
+            session.execute(_insert_ignoring_conflicts(session, link_table), links)
+        linked += len(links)
+
+    return linked
@@ -1,17 +1,158 @@
+import asyncio
 import logging
+import os
+import re
+import time
 import uuid
-from typing import Dict, Any, Optional, List
+from collections import defaultdict, deque
+from functools import lru_cache
+from statistics import fmean
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone
 from google.adk.sessions import DatabaseSessionService, Session
-from sqlalchemy.orm import Session as DBSession
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session as DBSession, sessionmaker
 
-from app.models.database import SessionHistory, UserProfile
+from app.models.database import SessionHistory, UserProfile, json_merge
 from app.services.user_profile_service import UserProfileService
-from app.services.memory_service import JarvisMemoryService
+from app.services.memory_service import JarvisMemoryService, memory_content_hash
 from app.config.constants import DEFAULT_USER_ID, APP_NAME  # Import from constants instead
 
+def _keyword_pattern(keywords) -> str:
+    """Regex alternation matching any of the keywords literally, longest first"""
+    return "|".join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+
+def _compile_keywords(keywords) -> re.Pattern:
+    """Case-insensitive regex matching any of the keywords anywhere in a text"""
+    return re.compile(_keyword_pattern(keywords), re.IGNORECASE)
+
+# Runs of text between full stops
+_SENTENCE_RE = re.compile(r"[^.]+")
+
+def _matching_sentences(pattern: re.Pattern, text: str):
+    """Yield (sentence, first match) for each '.'-separated sentence of text that pattern matches"""
+    for sentence in _SENTENCE_RE.findall(text):
+        match = pattern.search(sentence)
+        if match:
+            yield sentence, match
+
+# Explicit preference phrases and the confidence a match carries
+_PREFERENCE_PATTERNS = {
+    "i prefer": 0.9,
+    "i like": 0.8,
+    "i want": 0.8,
+    "i need": 0.8,
+    "i always": 0.85,
+    "i usually": 0.75,
+    "i don't like": 0.85,
+    "i hate": 0.9,
+    "please": 0.6,
+    "could you": 0.6,
+}
+_PREFERENCE_RE = re.compile(r"\b(" + _keyword_pattern(_PREFERENCE_PATTERNS) + r")\b", re.IGNORECASE)
+
+# Common topic keywords
+_TOPIC_KEYWORDS = {
+    "calendar": ("schedule", "appointment", "meeting", "event", "calendar"),
+    "email": ("email", "mail", "message", "send", "inbox"),
+    "travel": ("directions", "drive", "location", "address", "map"),
+    "entertainment": ("video", "youtube", "watch", "music"),
+    "social": ("tweet", "twitter", "post", "social"),
+    "productivity": ("reminder", "task", "todo", "organize"),
+    "weather": ("weather", "temperature", "forecast", "rain"),
+    "shopping": ("buy", "purchase", "order", "shopping")
+}
+
+# One named group per topic so a single scan reports every topic mentioned
+_TOPIC_RE = re.compile("|".join(
+    f"(?P<{topic}>{_keyword_pattern(keywords)})"
+    for topic, keywords in _TOPIC_KEYWORDS.items()
+), re.IGNORECASE)
+
+# Phrases and topics that make an interaction worth remembering
+_IMPORTANCE_PREFERENCE_RE = _compile_keywords((
+    "i prefer", "i like", "i want", "i need",
+    "i always", "i usually", "i don't like", "i hate",
+    "my name is", "call me"
+))
+_IMPORTANT_TOPICS_RE = _compile_keywords((
+    "schedule", "reminder", "preference", "profile",
+    "remember", "forget", "always", "never"
+))
+
+# Preference categories
+_COMMUNICATION_RE = _compile_keywords(("say", "tell", "explain", "show", "respond"))
+_INTERFACE_RE = _compile_keywords(("display", "format", "layout", "style"))
+_TASK_RE = _compile_keywords(("when", "how", "what", "workflow", "process"))
+
+# Communication style
+_FORMAL_RE = _compile_keywords(("please", "would you", "could you", "kindly"))
+_INFORMAL_RE = _compile_keywords(("hey", "hi", "thanks", "cool"))
+
+# Outcome recorded for a session that used a tool
+_TOOL_OUTCOMES = {
+    "calendar": "Calendar management",
+    "email": "Email management",
+    "gmail": "Email management",
+}
+
+# Thanks after a tool use suggests it went well
+_THANKS_RE = _compile_keywords(("thank",))
+
+# Contextual memory extraction
+_FACT_RE = _compile_keywords(("i am", "i'm", "my name is", "i work", "i live"))
+_STATED_PREFERENCE_RE = _compile_keywords(("i prefer", "i like", "i want", "i need", "i don't like"))
+_QUESTION_RE = _compile_keywords(("how", "what", "why", "when", "where", "can you", "could you"))
+_ACTION_RE = _compile_keywords(("i have", "i will", "i've", "done", "completed", "created", "updated", "here's"))
+
+@lru_cache(maxsize=1024)
+def _extract_topics(text: str) -> Tuple[str, ...]:
+    """Topics mentioned in text; cached since greetings and common requests recur"""
+    found = {match.lastgroup for match in _TOPIC_RE.finditer(text)}
+    return tuple(topic for topic in _TOPIC_KEYWORDS if topic in found)
+
+@lru_cache(maxsize=4096)
+def _preference_category(text: str, tools_used: Tuple[str, ...]) -> str:
+    """Category of a preference sentence; cached since users repeat the same phrasing"""
+    
+    # Communication preferences
+    if _COMMUNICATION_RE.search(text):
+        return "communication"
+    
+    # Tool preferences
+    if tools_used and _compile_keywords(tools_used).search(text):
+        return "functionality"
+    
+    # Interface preferences
+    if _INTERFACE_RE.search(text):
+        return "interface"
+    
+    # Task preferences
+    if _TASK_RE.search(text):
+        return "task"
+    
+    return "general"
+
+def _uuid7() -> str:
+    """Time-ordered UUID (version 7), so new session IDs append to the primary key index"""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version
+    value = value & ~(0x3 << 62) | 0x2 << 62  # variant
+    return str(uuid.UUID(int=value))
+
 class EnhancedSessionService(DatabaseSessionService):
+    # Active sessions idle for longer than this (seconds) are ended and evicted
+    ACTIVE_SESSION_TTL = 3600
+    # Interactions waiting for preference learning and contextual memory extraction;
+    # newer ones are dropped when full
+    MEMORY_QUEUE_SIZE = 256
+    # Queued interactions are processed together, up to this many per batch, waiting at
+    # most this long (seconds) after the first for more to arrive
+    MEMORY_BATCH_SIZE = 5
+    MEMORY_BATCH_WINDOW = 0.5
+    # Interactions kept in memory per session; the older half is written out when full
+    INTERACTION_BUFFER_SIZE = 64
+    
     def __init__(
         self, 
         db_url: str, 
@@ -20,13 +161,43 @@ class EnhancedSessionService(DatabaseSessionService):
         memory_service: JarvisMemoryService
     ):
         super().__init__(db_url=db_url)
+        self._share_engine(db_session)
         self.db_session = db_session
         self.user_profile_service = user_profile_service
         self.memory_service = memory_service
         self.logger = logging.getLogger(__name__)
         
-        # Track active sessions for memory management
+        # Session history is written from worker threads, which can't share db_session,
+        # so each write gets its own short-lived database session
+        self._history_session_factory = sessionmaker(bind=db_session.get_bind(), expire_on_commit=False)
+        
+        # Track active sessions for memory management. This state is per process,
+        # so multi-worker deployments need session-affine routing.
         self.active_sessions: Dict[str, Dict[str, Any]] = {}
+        
+        # Preferences and contextual memory are written in the background, off the user's turn.
+        # The queue and its worker belong to an event loop, so they're created on the loop
+        # that first queues an interaction, and again if another loop takes over
+        self._memory_queue: Optional[asyncio.Queue] = None
+        self._memory_worker: Optional[asyncio.Task] = None
+        # Sweep ending idle sessions, run in the background so new sessions don't wait on it
+        self._idle_sweep: Optional[asyncio.Task] = None
+    
+    def _share_engine(self, db_session: DBSession):
+        """Run ADK session storage on the application's pooled engine.
+        
+        DatabaseSessionService builds its own engine with default pool settings;
+        when it points at the same server database, swap in the engine from
+        DatabaseConfig so both share one tuned connection pool.
+        """
+        engine = db_session.get_bind()
+        if engine.dialect.name == "sqlite" or engine.url != self.db_engine.url:
+            return
+        
+        self.db_engine.dispose()
+        self.db_engine = engine
+        self.inspector = inspect(engine)
+        self.database_session_factory = sessionmaker(bind=engine)
     
     async def create_session_with_context(
         self, 
@@ -37,110 +208,75 @@ class EnhancedSessionService(DatabaseSessionService):
     ) -> Session:
         """Create session with enriched user context and memory"""
         
+        # Abandoned sessions would otherwise hold their buffered interactions forever
+        self._schedule_idle_sweep()
+        
         # Generate unique session ID if not provided
         if not session_id:
-            session_id = str(uuid.uuid4())
+            session_id = _uuid7()
         
-        # Get user profile and preferences (always use default user)
-        user_profile = await self.user_profile_service.get_user_profile(DEFAULT_USER_ID)
-        user_preferences = await self.user_profile_service.get_user_preferences(DEFAULT_USER_ID)
+        now = datetime.now(timezone.utc)
         
-        # Get contextual memories (with better default context)
-        try:
-            contextual_memories = await self.memory_service.get_contextual_memories(
-                user_id=DEFAULT_USER_ID,
-                current_context={"query": "session initialization", "session_start": True},
-                max_memories=5
-            )
-        except Exception as e:
-            self.logger.warning(f"Failed to get contextual memories: {str(e)}")
-            contextual_memories = {"relevant_memories": [], "context_summary": ""}
-        
-        # Build enriched context
-        enriched_context = {
-            "user_profile": user_profile,
-            "user_preferences": user_preferences,
-            "contextual_memories": contextual_memories,
-            "session_context": initial_context or {},
-            "memory_summary": contextual_memories.get("context_summary", ""),
-            "communication_style": user_profile.get("communication_style", {}),
-            "session_start_time": datetime.utcnow().isoformat()
-        }
+        # Get user preferences (always use default user) while the contextual memories are fetched
+        (_, user_preferences), contextual_memories = await asyncio.gather(
+            self.user_profile_service.get_profile_and_preferences(DEFAULT_USER_ID),
+            self._get_initial_memories()
+        )
         
-        # Create ADK session with retry logic for unique constraint
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                session = await super().create_session(
-                    app_name=app_name,
-                    user_id=DEFAULT_USER_ID,  # Always use default user
-                    session_id=session_id if attempt == 0 else str(uuid.uuid4())
-                )
-                break
-            except IntegrityError:
-                if attempt == max_retries - 1:
-                    raise
-                continue
+        # Create ADK session. Generated IDs can't collide, so a duplicate can only be a
+        # caller-supplied ID and the IntegrityError is left to propagate
+        session = await super().create_session(
+            app_name=app_name,
+            user_id=DEFAULT_USER_ID,  # Always use default user
+            session_id=session_id
+        )
         
-        # Create or update session history record with JSON-safe data
+        # Create or update session history record with JSON-safe data, off the event loop
         try:
-            current_time = datetime.utcnow()
-            
-            # Check for existing session history
-            existing_session = self.db_session.query(SessionHistory).filter(
-                SessionHistory.session_id == session.id
-            ).first()
-            
-            if existing_session:
-                # Update existing session
-                existing_session.is_active = True
-                existing_session.session_metadata.update({
-                    "app_name": app_name,
-                    "context_memories_count": len(contextual_memories.get("relevant_memories", [])),
-                    "user_preferences_count": len(user_preferences),
-                    "initial_context": initial_context or {},
-                    "start_time": current_time.isoformat()
-                })
-            else:
-                # Create new session history
-                session_history = SessionHistory(
-                    session_id=session.id,
-                    user_id=DEFAULT_USER_ID,  # Always use default user
-                    created_at=current_time,
-                    session_metadata={
-                        "app_name": app_name,
-                        "context_memories_count": len(contextual_memories.get("relevant_memories", [])),
-                        "user_preferences_count": len(user_preferences),
-                        "initial_context": initial_context or {},
-                        "start_time": current_time.isoformat()
-                    },
-                    is_active=True
-                )
-                self.db_session.add(session_history)
-            
-            try:
-                self.db_session.commit()
-            except Exception as e:
-                self.db_session.rollback()
-                self.logger.warning(f"Failed to update session history, continuing anyway: {str(e)}")
-            
+            await asyncio.to_thread(self._save_session_history, session.id, now, {
+                "app_name": app_name,
+                "context_memories_count": len(contextual_memories.get("relevant_memories", [])),
+                "user_preferences_count": len(user_preferences),
+                "initial_context": initial_context or {},
+                "start_time": now.isoformat()
+            })
         except Exception as e:
-            self.logger.error(f"Failed to create session history: {str(e)}")
-            # Continue anyway as this is not critical
+            self.logger.warning(f"Failed to update session history, continuing anyway: {str(e)}")
         
         # Track session for memory management
         self.active_sessions[session.id] = {
             "user_id": DEFAULT_USER_ID,  # Always use default user
-            "start_time": datetime.utcnow().isoformat(),
-            "interactions": [],
-            "topics_discussed": [],
+            "start_time": now,
+            "start_monotonic": time.monotonic(),  # For durations, without datetime arithmetic
+            "interactions": deque(),
+            "interactions_recorded": 0,  # Interactions already written out of the buffer
+            "topics_discussed": {},  # Insertion-ordered set: topic -> None, in order first discussed
             "tools_used": set(),
-            "session_context": enriched_context
+            # Running per-tool importance totals and count of significant interactions,
+            # so insights needn't rescan interactions (some of which are already spilled)
+            "tool_importance_sum": defaultdict(float),
+            "tool_importance_count": defaultdict(int),
+            "high_importance_count": 0,
+            "adk_session": session,  # Kept so updates needn't fetch it from ADK
+            "last_activity": time.monotonic()
         }
         
         self.logger.info(f"Created enhanced session {session.id} for default user")
         return session
     
+    async def _get_initial_memories(self) -> Dict[str, Any]:
+        """Get contextual memories for a new session, or none if they can't be fetched"""
+        try:
+            # Better default context for session start
+            return await self.memory_service.get_contextual_memories(
+                user_id=DEFAULT_USER_ID,
+                current_context={"query": "session initialization", "session_start": True},
+                max_memories=5
+            )
+        except Exception as e:
+            self.logger.warning(f"Failed to get contextual memories: {str(e)}")
+            return {"relevant_memories": [], "context_summary": ""}
+    
     async def update_session_context(
         self,
         session_id: str,
@@ -156,11 +292,11 @@ class EnhancedSessionService(DatabaseSessionService):
             return
         
         session_data = self.active_sessions[session_id]
+        session_data["last_activity"] = time.monotonic()
+        now = datetime.now(timezone.utc)
         
         # Record interaction if we have both input and response
         if user_input or agent_response:  # Changed to allow partial updates
-            current_time = datetime.utcnow().isoformat()
-            
             # Get existing interaction or create new one
             last_interaction = (session_data["interactions"][-1] 
                               if session_data["interactions"] else {})
@@ -168,8 +304,14 @@ class EnhancedSessionService(DatabaseSessionService):
             interaction = {
                 "user_input": user_input or last_interaction.get("user_input", ""),
                 "agent_response": agent_response or last_interaction.get("agent_response", ""),
-                "timestamp": current_time,
+                "timestamp": now.isoformat(),
                 "tools_used": tools_used or last_interaction.get("tools_used", []),
+                # The interaction row already stores the turn's input and response,
+                # so don't persist the "last_interaction" echo of them a second time
+                "context_data": {
+                    key: value for key, value in new_context.items()
+                    if key != "last_interaction"
+                },
                 "importance_score": self._calculate_interaction_importance(
                     user_input or last_interaction.get("user_input", ""),
                     agent_response or last_interaction.get("agent_response", ""),
@@ -181,8 +323,11 @@ class EnhancedSessionService(DatabaseSessionService):
             if user_input or (agent_response and not last_interaction.get("agent_response")):
                 session_data["interactions"].append(interaction)
             else:
-                # Update the last interaction
+                # Update the last interaction, replacing its share of the running counters
+                self._tally_interaction(session_data, last_interaction, -1)
                 session_data["interactions"][-1].update(interaction)
+                interaction = session_data["interactions"][-1]
+            self._tally_interaction(session_data, interaction)
             
             # Update tools used
             if tools_used:
@@ -190,57 +335,123 @@ class EnhancedSessionService(DatabaseSessionService):
             
             # Extract topics from interaction
             if user_input and agent_response:  # Only extract topics for complete interactions
-                topics = await self._extract_topics_from_interaction(user_input, agent_response)
-                session_data["topics_discussed"].extend(topics)
-            
-            # Record interaction in user profile service
-            await self.user_profile_service.record_interaction(
-                user_id=DEFAULT_USER_ID,  # Always use default user
+                topics = self._extract_topics_from_interaction(user_input, agent_response)
+                session_data["topics_discussed"].update(dict.fromkeys(topics))
+            
+            # Interactions are buffered here and written in batches
+            if len(session_data["interactions"]) >= self.INTERACTION_BUFFER_SIZE:
+                await self._spill_interactions(session_id, session_data)
+            
+            # Learn preferences from complete interactions, and update memory context for
+            # any significant interaction, in the background
+            learned_from = (user_input, agent_response, tools_used) if user_input and agent_response else None
+            self._queue_interaction(session_id, interaction, learned_from)
+        
+        # Use the ADK session kept since creation, fetching it only if it wasn't
+        session = session_data.get("adk_session")
+        if session is None:
+            session = await self.get_session(
                 session_id=session_id,
-                user_input=user_input or last_interaction.get("user_input", ""),
-                agent_response=agent_response or last_interaction.get("agent_response", ""),
-                tools_used=tools_used,
-                context_data=new_context
+                app_name=APP_NAME,
+                user_id=DEFAULT_USER_ID
             )
-            
-            # Learn preferences from complete interactions
-            if user_input and agent_response:
-                await self._learn_preferences_from_interaction(
-                    DEFAULT_USER_ID,  # Always use default user
-                    user_input,
-                    agent_response,
-                    tools_used
-                )
-        
-        # Update session context
-        session_data["session_context"].update(new_context)
-        
-        # Get updated session from ADK
-        session = await self.get_session(
-            session_id=session_id,
-            app_name=APP_NAME,
-            user_id=DEFAULT_USER_ID
-        )
+            session_data["adk_session"] = session
         if session:
             # Update session state with new context
-            updated_state = session.state.copy()
-            updated_state.update(new_context)
+            session.state.update(new_context)
             
             # Add dynamic context from current session
-            updated_state["session_stats"] = {
-                "interactions_count": len(session_data["interactions"]),
-                "tools_used": list(session_data["tools_used"]),
-                "topics_discussed": list(set(session_data["topics_discussed"])),
-                "session_duration": (datetime.utcnow() - datetime.fromisoformat(session_data["start_time"])).seconds
+            session.state["session_stats"] = {
+                "interactions_count": session_data["interactions_recorded"] + len(session_data["interactions"]),
+                "tools_used": sorted(session_data["tools_used"]),
+                "topics_discussed": list(session_data["topics_discussed"]),
+                "session_duration": int(time.monotonic() - session_data["start_monotonic"])
             }
+    
+    async def _spill_interactions(self, session_id: str, session_data: Dict[str, Any]):
+        """Write the older half of a session's interaction buffer to the database"""
+        interactions = session_data["interactions"]
+        spilled = [interactions.popleft() for _ in range(len(interactions) // 2)]
+        
+        try:
+            await self.user_profile_service.record_interactions(
+                user_id=session_data["user_id"],
+                session_id=session_id,
+                interactions=spilled
+            )
+            session_data["interactions_recorded"] += len(spilled)
+        except Exception as e:
+            self.db_session.rollback()
+            # Keep them buffered for the end-of-session write
+            interactions.extendleft(reversed(spilled))
+            self.logger.warning(f"Failed to record interactions for session {session_id}: {str(e)}")
+    
+    def _queue_interaction(
+        self,
+        session_id: str,
+        interaction: Dict[str, Any],
+        learned_from: Optional[Tuple[str, str, Optional[List[str]]]] = None
+    ):
+        """Hand an interaction to the background worker for contextual memory and,
+        given the (user_input, agent_response, tools_used) of a complete turn, preference learning"""
+        loop = asyncio.get_running_loop()
+        if self._memory_worker is None or self._memory_worker.get_loop() is not loop:
+            self._memory_queue = asyncio.Queue(maxsize=self.MEMORY_QUEUE_SIZE)
+            self._memory_worker = None
+        if self._memory_worker is None or self._memory_worker.done():
+            self._memory_worker = loop.create_task(self._interaction_worker(self._memory_queue))
+        
+        try:
+            # Copy, since the last interaction is updated in place by later partial updates
+            self._memory_queue.put_nowait((session_id, dict(interaction), learned_from))
+        except asyncio.QueueFull:
+            self.logger.warning(f"Interaction queue full, skipping interaction for session {session_id}")
+    
+    async def _interaction_worker(self, queue: asyncio.Queue):
+        """Process queued interactions in batches of up to MEMORY_BATCH_SIZE, waiting at
+        most MEMORY_BATCH_WINDOW seconds after the first one for the rest to arrive"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.MEMORY_BATCH_WINDOW
+            while len(batch) < self.MEMORY_BATCH_SIZE:
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
             
-            # Update memory context for any significant interaction
-            if user_input or agent_response:
+            try:
+                await self._process_interaction_batch(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+    
+    async def _process_interaction_batch(self, batch: List[Tuple[str, Dict[str, Any], Optional[Tuple]]]):
+        """Store the preferences learned across a batch of interactions in one update,
+        then their contextual memories"""
+        preferences = [
+            preference
+            for _, _, learned_from in batch if learned_from
+            for preference in self._extract_interaction_preferences(*learned_from)
+        ]
+        try:
+            await self.user_profile_service.update_preferences(
+                DEFAULT_USER_ID,  # Always use default user
+                preferences
+            )
+        except Exception as e:
+            self.db_session.rollback()
+            self.logger.warning(f"Failed to learn preferences from {len(batch)} interactions: {str(e)}")
+        
+        for session_id, interaction, _ in batch:
+            try:
                 await self._update_contextual_memory(
                     session_id=session_id,
                     user_id=DEFAULT_USER_ID,  # Always use default user
                     interaction=interaction
                 )
+            except Exception as e:
+                self.logger.warning(f"Failed to update contextual memory for session {session_id}: {str(e)}")
     
     async def end_session_with_memory_capture(self, session_id: str) -> Optional[Dict[str, Any]]:
         """End session and capture memories and insights"""
@@ -251,76 +462,94 @@ class EnhancedSessionService(DatabaseSessionService):
         
         session_data = self.active_sessions[session_id]
         user_id = session_data["user_id"]
+        now = datetime.now(timezone.utc)
         
         try:
             # Extract session insights
-            session_insights = await self._extract_session_insights(session_data)
-            
-            # Update session history
-            session_history = self.db_session.query(SessionHistory).filter(
-                SessionHistory.session_id == session_id
-            ).first()
+            session_insights = self._extract_session_insights(session_data)
             
-            if session_history:
-                session_history.ended_at = datetime.utcnow()
-                session_history.session_summary = session_insights["summary"]
-                session_history.topics_discussed = session_insights["topics"]
-                session_history.outcomes = session_insights["outcomes"]
-                session_history.is_active = False
-                
-                # Update metadata
-                metadata = session_history.session_metadata or {}
-                metadata.update({
-                    "total_interactions": session_insights["total_interactions"],
-                    "session_duration": session_insights["session_duration"],
-                    "tools_effectiveness": session_insights["tools_effectiveness"]
-                })
-                session_history.session_metadata = metadata
-                
-                try:
-                    self.db_session.commit()
-                except Exception as e:
-                    self.db_session.rollback()
-                    self.logger.warning(f"Failed to update session history on end: {str(e)}")
+            # Persist the interactions still buffered in a single bulk insert
+            try:
+                await self.user_profile_service.record_interactions(
+                    user_id=user_id,
+                    session_id=session_id,
+                    interactions=list(session_data["interactions"])
+                )
+            except Exception as e:
+                self.db_session.rollback()
+                self.logger.warning(f"Failed to record session interactions: {str(e)}")
             
-            # Store session memories even if history update fails
-            await self.memory_service.store_session_memory(
-                session_id=session_id,
-                user_id=user_id,
-                session_data={
-                    "summary": session_insights["summary"],
-                    "topics": session_insights["topics"],
-                    "tools_used": list(session_data["tools_used"]),
-                    "interactions": session_data["interactions"],
-                    "outcomes": session_insights["outcomes"],
-                    "session_length": session_insights["session_duration"]
-                }
+            # Update session history (off the event loop), store session memories and
+            # update user preferences concurrently; each may fail without stopping the others
+            session_history, memory_result, preferences_result = await asyncio.gather(
+                asyncio.to_thread(self._update_session_history, session_id, session_insights, now),
+                self.memory_service.store_session_memory(
+                    session_id=session_id,
+                    user_id=user_id,
+                    session_data={
+                        "summary": session_insights["summary"],
+                        "topics": session_insights["topics"],
+                        "tools_used": session_insights["tools_used"],
+                        "interactions": list(session_data["interactions"]),
+                        "outcomes": session_insights["outcomes"],
+                        "session_length": session_insights["session_duration"]
+                    }
+                ),
+                self._update_user_preferences_from_session(user_id, session_data, session_insights),
+                return_exceptions=True
             )
             
-            # Update user preferences based on session
-            await self._update_user_preferences_from_session(user_id, session_data, session_insights)
+            if isinstance(session_history, Exception):
+                self.logger.warning(f"Failed to update session history on end: {str(session_history)}")
+                session_history = None
+            if isinstance(memory_result, Exception):
+                self.logger.warning(f"Failed to store session memory: {str(memory_result)}")
+            if isinstance(preferences_result, Exception):
+                self.db_session.rollback()
+                self.logger.warning(f"Failed to update preferences from session: {str(preferences_result)}")
             
             # Clean up active session
             del self.active_sessions[session_id]
             
             self.logger.info(f"Ended session {session_id} with memory capture for user {user_id}")
-            return session_history.to_dict() if session_history else None
+            return session_history
             
         except Exception as e:
             self.logger.error(f"Error ending session {session_id}: {str(e)}")
             return None
     
-    async def _extract_session_insights(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _schedule_idle_sweep(self):
+        """End idle sessions in the background, unless a sweep is already running"""
+        loop = asyncio.get_running_loop()
+        if self._idle_sweep is None or self._idle_sweep.done() or self._idle_sweep.get_loop() is not loop:
+            self._idle_sweep = loop.create_task(self._end_idle_sessions())
+    
+    async def _end_idle_sessions(self):
+        """End active sessions that have seen no activity within ACTIVE_SESSION_TTL"""
+        cutoff = time.monotonic() - self.ACTIVE_SESSION_TTL
+        idle_session_ids = [
+            session_id for session_id, session_data in self.active_sessions.items()
+            if session_data["last_activity"] < cutoff
+        ]
+        
+        for session_id in idle_session_ids:
+            self.logger.info(f"Ending idle session {session_id}")
+            await self.end_session_with_memory_capture(session_id)
+            # Evict even if memory capture failed
+            self.active_sessions.pop(session_id, None)
+    
+    def _extract_session_insights(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract key insights from session data"""
         
         interactions = session_data["interactions"]
-        tools_used = list(session_data["tools_used"])
-        topics = list(set(session_data["topics_discussed"]))
+        total_interactions = session_data["interactions_recorded"] + len(interactions)
+        tools_used = sorted(session_data["tools_used"])
+        topics = list(session_data["topics_discussed"])
         
         # Generate session summary
         summary_parts = []
-        if len(interactions) > 0:
-            summary_parts.append(f"Session with {len(interactions)} interactions")
+        if total_interactions > 0:
+            summary_parts.append(f"Session with {total_interactions} interactions")
         
         if tools_used:
             summary_parts.append(f"Used tools: {', '.join(tools_used)}")
@@ -332,148 +561,136 @@ class EnhancedSessionService(DatabaseSessionService):
         
         # Identify outcomes
         outcomes = []
-        high_importance_interactions = [
-            i for i in interactions if i.get("importance_score", 0) > 0.7
-        ]
-        
-        if high_importance_interactions:
-            outcomes.append(f"Completed {len(high_importance_interactions)} significant tasks")
+        if session_data["high_importance_count"]:
+            outcomes.append(f"Completed {session_data['high_importance_count']} significant tasks")
         
-        if "calendar" in str(tools_used).lower():
-            outcomes.append("Calendar management")
-            
-        if "email" in str(tools_used).lower() or "gmail" in str(tools_used).lower():
-            outcomes.append("Email management")
+        # Outcomes implied by the tools used, once each
+        used = {tool.lower() for tool in tools_used}
+        outcomes.extend(dict.fromkeys(
+            outcome for tool, outcome in _TOOL_OUTCOMES.items() if tool in used
+        ))
         
         return {
             "summary": summary,
             "topics": topics,
             "outcomes": outcomes,
-            "total_interactions": len(interactions),
-            "session_duration": (datetime.utcnow() - datetime.fromisoformat(session_data["start_time"])).seconds,
-            "tools_effectiveness": self._calculate_tools_effectiveness(interactions, tools_used)
+            "tools_used": tools_used,
+            "total_interactions": total_interactions,
+            "session_duration": int(time.monotonic() - session_data["start_monotonic"]),
+            "tools_effectiveness": self._calculate_tools_effectiveness(session_data, tools_used)
         }
     
-    async def _update_session_history(self, session_id: str, insights: Dict[str, Any]):
-        """Update session history with insights"""
-        
-        session_history = self.db_session.query(SessionHistory).filter(
-            SessionHistory.session_id == session_id
-        ).first()
-        
-        if session_history:
-            session_history.ended_at = datetime.utcnow()
-            session_history.session_summary = insights["summary"]
-            session_history.topics_discussed = insights["topics"]
-            session_history.outcomes = insights["outcomes"]
-            session_history.is_active = False
+    def _save_session_history(self, session_id: str, now: datetime, metadata: Dict[str, Any]):
+        """Create the session's history record, or reactivate it with merged metadata.
+        
+        Blocking; runs in a worker thread with its own database session.
+        """
+        with self._history_session_factory() as db:
+            # Update existing session, merging the metadata in the database
+            result = db.execute(
+                update(SessionHistory)
+                .where(SessionHistory.session_id == session_id)
+                .values(is_active=True, session_metadata=json_merge(SessionHistory.session_metadata, metadata))
+            )
             
-            # Update metadata
-            metadata = session_history.session_metadata or {}
-            metadata.update({
-                "total_interactions": insights["total_interactions"],
-                "session_duration": insights["session_duration"],
-                "tools_effectiveness": insights["tools_effectiveness"]
-            })
-            session_history.session_metadata = metadata
+            if result.rowcount == 0:
+                # Create new session history
+                db.add(SessionHistory(
+                    session_id=session_id,
+                    user_id=DEFAULT_USER_ID,  # Always use default user
+                    created_at=now,
+                    session_metadata=metadata,
+                    is_active=True
+                ))
             
-            self.db_session.commit()
-        
-        return session_history
+            db.commit()
     
-    async def _learn_preferences_from_interaction(
+    def _update_session_history(self, session_id: str, insights: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+        """Close the session's history record with its insights and return it as a dict.
+        
+        Blocking; runs in a worker thread with its own database session.
+        """
+        with self._history_session_factory() as db:
+            session_history = db.execute(
+                update(SessionHistory)
+                .where(SessionHistory.session_id == session_id)
+                .values(
+                    ended_at=now,
+                    session_summary=insights["summary"],
+                    topics_discussed=insights["topics"],
+                    outcomes=insights["outcomes"],
+                    is_active=False,
+                    session_metadata=json_merge(SessionHistory.session_metadata, {
+                        "total_interactions": insights["total_interactions"],
+                        "session_duration": insights["session_duration"],
+                        "tools_effectiveness": insights["tools_effectiveness"]
+                    })
+                )
+                .returning(SessionHistory)
+            ).scalar_one_or_none()
+            
+            db.commit()
+            return session_history.to_dict() if session_history else None
+    
+    def _extract_interaction_preferences(
         self,
-        user_id: str,
         user_input: str,
         agent_response: str,
         tools_used: Optional[List[str]]
-    ):
-        """Learn user preferences from interactions"""
-        
-        # Detect explicit preferences with more patterns
-        preference_patterns = [
-            ("I prefer", 0.9),
-            ("I like", 0.8),
-            ("I want", 0.8),
-            ("I need", 0.8),
-            ("I always", 0.85),
-            ("I usually", 0.75),
-            ("I don't like", 0.85),
-            ("I hate", 0.9),
-            ("please", 0.6),
-            ("could you", 0.6)
-        ]
-        
-        # Extract preferences from user input
-        for phrase, confidence in preference_patterns:
-            if phrase.lower() in user_input.lower():
-                sentences = user_input.split('.')
-                for sentence in sentences:
-                    if phrase.lower() in sentence.lower():
-                        # Determine preference category
-                        category = self._determine_preference_category(sentence, tools_used)
-                        
-                        # Store the preference
-                        await self.user_profile_service.update_preference(
-                            user_id=user_id,
-                            key=f"preference_{category}",
-                            value=sentence.strip(),
-                            preference_type="explicit",
-                            confidence=confidence,
-                            category=category
-                        )
-        
-        # Learn communication style preferences
-        await self._learn_communication_style(user_id, user_input, agent_response)
+    ) -> List[Dict[str, Any]]:
+        """Learn user preferences from an interaction, as update_preferences items"""
+        
+        preferences = []
+        
+        # Extract explicit preferences from each sentence that contains a preference phrase;
+        # the first phrase in a sentence decides its confidence
+        for sentence, match in _matching_sentences(_PREFERENCE_RE, user_input):
+            # Determine preference category
+            category = self._determine_preference_category(sentence, tools_used)
+            
+            preferences.append({
+                "key": f"preference_{category}",
+                "value": sentence.strip(),
+                "preference_type": "explicit",
+                "confidence": _PREFERENCE_PATTERNS[match.group(1).lower()],
+                "category": category
+            })
         
         # Learn tool preferences with more context
         if tools_used:
-            for tool in tools_used:
-                await self.user_profile_service.update_preference(
-                    user_id=user_id,
-                    key=f"tool_usage_{tool}",
-                    value={
+            last_used = datetime.now(timezone.utc).isoformat()
+            success_indicator = "positive" if _THANKS_RE.search(user_input) else "neutral"
+            preferences.extend(
+                {
+                    "key": f"tool_usage_{tool}",
+                    "value": {
                         "frequency": 1,
                         "context": user_input[:200],
-                        "last_used": datetime.utcnow().isoformat(),
-                        "success_indicator": "positive" if "thank" in user_input.lower() else "neutral"
+                        "last_used": last_used,
+                        "success_indicator": success_indicator
                     },
-                    preference_type="implicit",
-                    confidence=0.7,
-                    category="functionality"
-                )
+                    "preference_type": "implicit",
+                    "confidence": 0.7,
+                    "category": "functionality"
+                }
+                for tool in tools_used
+            )
+        
+        # Learn communication style preferences
+        preferences.append(self._communication_style_preference(user_input, agent_response))
+        
+        return preferences
     
     def _determine_preference_category(self, text: str, tools_used: Optional[List[str]] = None) -> str:
         """Determine the category of a preference based on its content"""
-        text = text.lower()
-        
-        # Communication preferences
-        if any(word in text for word in ["say", "tell", "explain", "show", "respond"]):
-            return "communication"
-        
-        # Tool preferences
-        if tools_used and any(tool.lower() in text for tool in tools_used):
-            return "functionality"
-        
-        # Interface preferences
-        if any(word in text for word in ["display", "format", "layout", "style"]):
-            return "interface"
-        
-        # Task preferences
-        if any(word in text for word in ["when", "how", "what", "workflow", "process"]):
-            return "task"
-        
-        return "general"
+        return _preference_category(text, tuple(tools_used or ()))
     
-    async def _learn_communication_style(self, user_id: str, user_input: str, agent_response: str):
+    def _communication_style_preference(self, user_input: str, agent_response: str) -> Dict[str, Any]:
         """Learn communication style preferences from interaction"""
         
-        # Analyze formality
-        formal_indicators = ["please", "would you", "could you", "kindly"]
-        informal_indicators = ["hey", "hi", "thanks", "cool"]
-        
-        formality_score = sum(1 for word in formal_indicators if word in user_input.lower())
-        informality_score = sum(1 for word in informal_indicators if word in user_input.lower())
+        # Analyze formality by the number of distinct indicators present
+        formality_score = len({match.group().lower() for match in _FORMAL_RE.finditer(user_input)})
+        informality_score = len({match.group().lower() for match in _INFORMAL_RE.finditer(user_input)})
         
         if formality_score > informality_score:
             style = "formal"
@@ -492,47 +709,26 @@ class EnhancedSessionService(DatabaseSessionService):
             verbosity = "balanced"
         
         # Update communication style preferences
-        await self.user_profile_service.update_preference(
-            user_id=user_id,
-            key="communication_style",
-            value={
+        return {
+            "key": "communication_style",
+            "value": {
                 "formality": style,
                 "verbosity": verbosity,
-                "last_updated": datetime.utcnow().isoformat()
+                "last_updated": datetime.now(timezone.utc).isoformat()
             },
-            preference_type="implicit",
-            confidence=0.65,
-            category="communication"
-        )
+            "preference_type": "implicit",
+            "confidence": 0.65,
+            "category": "communication"
+        }
     
-    async def _extract_topics_from_interaction(
+    def _extract_topics_from_interaction(
         self, 
         user_input: str, 
         agent_response: str
     ) -> List[str]:
         """Extract topics from interaction using simple keyword analysis"""
-        
-        topics = []
-        
-        # Common topic keywords
-        topic_keywords = {
-            "calendar": ["schedule", "appointment", "meeting", "event", "calendar"],
-            "email": ["email", "mail", "message", "send", "inbox"],
-            "travel": ["directions", "drive", "location", "address", "map"],
-            "entertainment": ["video", "youtube", "watch", "music"],
-            "social": ["tweet", "twitter", "post", "social"],
-            "productivity": ["reminder", "task", "todo", "organize"],
-            "weather": ["weather", "temperature", "forecast", "rain"],
-            "shopping": ["buy", "purchase", "order", "shopping"]
-        }
-        
-        combined_text = (user_input + " " + agent_response).lower()
-        
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in combined_text for keyword in keywords):
-                topics.append(topic)
-        
-        return topics
+        found = set(_extract_topics(user_input)).union(_extract_topics(agent_response))
+        return [topic for topic in _TOPIC_KEYWORDS if topic in found]
     
     def _calculate_interaction_importance(
         self,
@@ -541,66 +737,43 @@ class EnhancedSessionService(DatabaseSessionService):
         tools_used: Optional[List[str]] = None
     ) -> float:
         """Calculate importance score for an interaction"""
-        importance = 0.3  # Base importance
-        
-        # Check for preference indicators
-        preference_indicators = [
-            "I prefer", "I like", "I want", "I need",
-            "I always", "I usually", "I don't like", "I hate",
-            "my name is", "call me"
-        ]
-        
-        # Increase importance for preference-related interactions
-        for indicator in preference_indicators:
-            if indicator.lower() in user_input.lower():
-                importance += 0.3
-                break
-        
-        # Increase importance based on tools used
-        if tools_used:
-            importance += 0.2
-        
-        # Increase importance for longer, more detailed interactions
-        if len(user_input) > 50 or len(agent_response) > 100:
-            importance += 0.1
-        
-        # Increase importance for interactions with specific topics
-        important_topics = [
-            "schedule", "reminder", "preference", "profile",
-            "remember", "forget", "always", "never"
-        ]
-        
-        for topic in important_topics:
-            if topic in user_input.lower() or topic in agent_response.lower():
-                importance += 0.1
-                break
+        importance = (
+            0.3  # Base importance
+            # Preference-related interactions
+            + 0.3 * bool(_IMPORTANCE_PREFERENCE_RE.search(user_input))
+            # Interactions that used tools
+            + 0.2 * bool(tools_used)
+            # Longer, more detailed interactions
+            + 0.1 * (len(user_input) > 50 or len(agent_response) > 100)
+            # Interactions with specific topics
+            + 0.1 * bool(_IMPORTANT_TOPICS_RE.search(user_input) or _IMPORTANT_TOPICS_RE.search(agent_response))
+        )
         
         return min(1.0, importance)  # Cap at 1.0
     
+    def _tally_interaction(self, session_data: Dict[str, Any], interaction: Dict[str, Any], sign: int = 1):
+        """Add an interaction to the session's running counters, or remove it with sign=-1"""
+        importance = interaction.get("importance_score", 0.5)
+        for tool in interaction.get("tools_used", ()):
+            session_data["tool_importance_sum"][tool] += sign * importance
+            session_data["tool_importance_count"][tool] += sign
+        if importance > 0.7:
+            session_data["high_importance_count"] += sign
+    
     def _calculate_tools_effectiveness(
         self,
-        interactions: List[Dict[str, Any]],
+        session_data: Dict[str, Any],
         tools_used: List[str]
     ) -> Dict[str, float]:
         """Calculate effectiveness of tools used in session"""
         
-        effectiveness = {}
-        
-        for tool in tools_used:
-            tool_interactions = [
-                i for i in interactions 
-                if tool in i.get("tools_used", [])
-            ]
-            
-            if tool_interactions:
-                avg_importance = sum(
-                    i.get("importance_score", 0.5) for i in tool_interactions
-                ) / len(tool_interactions)
-                effectiveness[tool] = avg_importance
-            else:
-                effectiveness[tool] = 0.5
-        
-        return effectiveness
+        # Mean importance of the interactions that used each tool
+        importance_sum = session_data["tool_importance_sum"]
+        importance_count = session_data["tool_importance_count"]
+        return {
+            tool: importance_sum[tool] / importance_count[tool] if importance_count.get(tool) else 0.5
+            for tool in tools_used
+        }
     
     async def _update_contextual_memory(
         self,
@@ -616,81 +789,60 @@ class EnhancedSessionService(DatabaseSessionService):
             user_input = interaction['user_input']
             agent_response = interaction['agent_response']
             
-            # Extract facts and preferences
-            facts = []
-            preferences = []
-            
             # Look for facts in user input (statements about themselves)
-            fact_indicators = ["I am", "I'm", "my name is", "I work", "I live"]
-            for indicator in fact_indicators:
-                if indicator.lower() in user_input.lower():
-                    # Get the sentence containing the fact
-                    sentences = user_input.split('.')
-                    for sentence in sentences:
-                        if indicator.lower() in sentence.lower():
-                            facts.append(sentence.strip())
+            facts = [sentence.strip() for sentence, _ in _matching_sentences(_FACT_RE, user_input)]
             
             # Look for preferences in user input
-            preference_indicators = ["I prefer", "I like", "I want", "I need", "I don't like"]
-            for indicator in preference_indicators:
-                if indicator.lower() in user_input.lower():
-                    sentences = user_input.split('.')
-                    for sentence in sentences:
-                        if indicator.lower() in sentence.lower():
-                            preferences.append(sentence.strip())
+            preferences = [sentence.strip() for sentence, _ in _matching_sentences(_STATED_PREFERENCE_RE, user_input)]
+            
+            # Hashes of the facts and preferences already stored, kept by the memory service
+            seen_memories = await self.memory_service.list_memory_hashes(
+                user_id=DEFAULT_USER_ID,
+                memory_types=["fact", "preference"]
+            )
+            
+            # Memories worth keeping are written together once the interaction is scanned.
+            # The memory service adds them to the seen hashes once stored; new_hashes stops
+            # one interaction from storing the same content twice
+            to_store = []
+            new_hashes = {"fact": set(), "preference": set()}
             
             # If we found facts or preferences, store them separately
             for fact in facts:
                 # Check if this fact already exists
-                existing_memories = await self.memory_service.search_memories(
-                    user_id=DEFAULT_USER_ID,
-                    query=fact,
-                    memory_type="fact",
-                    limit=1
-                )
-                
-                if not existing_memories or not any(
-                    memory["content"] == fact for memory in existing_memories
-                ):
-                    await self.memory_service.store_memory(
-                        user_id=DEFAULT_USER_ID,
-                        content=fact,
-                        memory_type="fact",
-                        session_id=session_id,
-                        importance_score=0.8,  # Facts are important
-                        tags=["fact", "user_information"],
-                        metadata={
+                fact_hash = memory_content_hash(fact)
+                if fact_hash not in seen_memories["fact"] and fact_hash not in new_hashes["fact"]:
+                    new_hashes["fact"].add(fact_hash)
+                    to_store.append({
+                        "content": fact,
+                        "memory_type": "fact",
+                        "session_id": session_id,
+                        "importance_score": 0.8,  # Facts are important
+                        "tags": ["fact", "user_information"],
+                        "metadata": {
                             "source": "conversation",
                             "interaction_type": "fact",
                             "extracted_from": user_input[:100]
                         }
-                    )
+                    })
             
             for preference in preferences:
                 # Check if this preference already exists
-                existing_memories = await self.memory_service.search_memories(
-                    user_id=DEFAULT_USER_ID,
-                    query=preference,
-                    memory_type="preference",
-                    limit=1
-                )
-                
-                if not existing_memories or not any(
-                    memory["content"] == preference for memory in existing_memories
-                ):
-                    await self.memory_service.store_memory(
-                        user_id=DEFAULT_USER_ID,
-                        content=preference,
-                        memory_type="preference",
-                        session_id=session_id,
-                        importance_score=0.7,  # Preferences are important
-                        tags=["preference", "user_preference"],
-                        metadata={
+                preference_hash = memory_content_hash(preference)
+                if preference_hash not in seen_memories["preference"] and preference_hash not in new_hashes["preference"]:
+                    new_hashes["preference"].add(preference_hash)
+                    to_store.append({
+                        "content": preference,
+                        "memory_type": "preference",
+                        "session_id": session_id,
+                        "importance_score": 0.7,  # Preferences are important
+                        "tags": ["preference", "user_preference"],
+                        "metadata": {
                             "source": "conversation",
                             "interaction_type": "preference",
                             "extracted_from": user_input[:100]
                         }
-                    )
+                    })
             
             # For general conversation, only store if it's significant
             if interaction.get("importance_score", 0) > 0.5:
@@ -698,11 +850,11 @@ class EnhancedSessionService(DatabaseSessionService):
                 key_info = []
                 
                 # Add user question/request
-                if "?" in user_input or any(word in user_input.lower() for word in ["how", "what", "why", "when", "where", "can you", "could you"]):
+                if "?" in user_input or _QUESTION_RE.search(user_input):
                     key_info.append(f"User asked: {user_input}")
                 
                 # Add important agent responses (decisions, actions, confirmations)
-                if any(word in agent_response.lower() for word in ["i have", "i will", "i've", "done", "completed", "created", "updated", "here's"]):
+                if _ACTION_RE.search(agent_response):
                     key_info.append(f"Assistant action: {agent_response}")
                 
                 if key_info:
@@ -720,20 +872,24 @@ class EnhancedSessionService(DatabaseSessionService):
                     if not existing_memories or all(
                         memory["relevance_score"] < 0.8 for memory in existing_memories
                     ):
-                        await self.memory_service.store_memory(
-                            user_id=DEFAULT_USER_ID,
-                            content=memory_content,
-                            memory_type="conversation",
-                            session_id=session_id,
-                            importance_score=interaction["importance_score"],
-                            tags=interaction.get("tools_used", []) + ["conversation"],
-                            metadata={
+                        to_store.append({
+                            "content": memory_content,
+                            "memory_type": "conversation",
+                            "session_id": session_id,
+                            "importance_score": interaction["importance_score"],
+                            "tags": interaction.get("tools_used", []) + ["conversation"],
+                            "metadata": {
                                 "interaction_timestamp": interaction.get("timestamp"),
                                 "memory_type": "conversation",
                                 "interaction_type": "dialogue",
                                 "tools_used": interaction.get("tools_used", [])
                             }
-                        )
+                        })
+            
+            await self.memory_service.store_memories_bulk(
+                user_id=DEFAULT_USER_ID,
+                memories=to_store
+            )
     
     async def _update_user_preferences_from_session(
         self,
@@ -745,9 +901,9 @@ class EnhancedSessionService(DatabaseSessionService):
         
         # Update communication style based on session
         if len(session_data["interactions"]) > 3:
-            avg_response_length = sum(
+            avg_response_length = fmean(
                 len(i.get("agent_response", "")) for i in session_data["interactions"]
-            ) / len(session_data["interactions"])
+            )
             
             if avg_response_length > 300:
                 response_style = "detailed"
@@ -762,16 +918,16 @@ class EnhancedSessionService(DatabaseSessionService):
             )
         
         # Update tool preferences
-        if session_data["tools_used"]:
-            for tool in session_data["tools_used"]:
-                await self.user_profile_service.update_preference(
-                    user_id=user_id,
-                    key=f"tool_preference_{tool}",
-                    value=True,
-                    preference_type="implicit",
-                    confidence=0.7,
-                    category="functionality"
-                )
+        await self.user_profile_service.update_preferences(user_id, [
+            {
+                "key": f"tool_preference_{tool}",
+                "value": True,
+                "preference_type": "implicit",
+                "confidence": 0.7,
+                "category": "functionality"
+            }
+            for tool in session_data["tools_used"]
+        ])
     
     async def get_session(self, session_id: str, app_name: str = None, user_id: str = None) -> Optional[Session]:
         """Get a session by ID with proper error handling"""
@@ -796,10 +952,10 @@ class EnhancedSessionService(DatabaseSessionService):
                 session_data = self.active_sessions[session_id]
                 session.state.update({
                     "session_stats": {
-                        "interactions_count": len(session_data["interactions"]),
-                        "tools_used": list(session_data["tools_used"]),
-                        "topics_discussed": list(set(session_data["topics_discussed"])),
-                        "session_duration": (datetime.utcnow() - datetime.fromisoformat(session_data["start_time"])).seconds
+                        "interactions_count": session_data["interactions_recorded"] + len(session_data["interactions"]),
+                        "tools_used": sorted(session_data["tools_used"]),
+                        "topics_discussed": list(session_data["topics_discussed"]),
+                        "session_duration": int(time.monotonic() - session_data["start_monotonic"])
                     }
                 })
             
@@ -1,28 +1,161 @@
 import logging
 import uuid
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Union
+from datetime import datetime, timedelta, timezone
 import asyncio
-import json
+import functools
+from itertools import chain
+import hashlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import os
 import re
+import time
 
+from cachetools import LRUCache, TTLCache
 import chromadb
 from chromadb.config import Settings
 import vertexai
 from vertexai.preview.language_models import TextEmbeddingModel, TextEmbeddingInput
 import numpy as np
-from sqlalchemy.orm import Session as DBSession
+from sqlalchemy import delete, desc, select
+from sqlalchemy.orm import Session as DBSession, selectinload
 
-from app.models.database import MemoryVector
+from app.models.database import MemoryVector, Tag, get_or_create_tags, memory_tags
 from app.config.constants import DEFAULT_USER_ID
 
+# Phrases that mark a sentence of a stored memory as a user preference
+_PREFERENCE_INDICATOR_RE = re.compile(
+    "|".join(re.escape(indicator) for indicator in (
+        "I prefer", "I like", "I always", "I usually", "I want",
+        "I need", "My favorite", "I don't like", "I hate",
+    )),
+    re.IGNORECASE,
+)
+
+# Filter on the user every memory is stored under
+_USER_WHERE = {"user_id": DEFAULT_USER_ID}
+
+def _search_where(memory_type: Optional[Union[str, List[str]]], min_importance: float) -> Dict[str, Any]:
+    """Where clause for a memory search, the user filter alone when nothing else applies"""
+    conditions = [_USER_WHERE]
+    
+    if isinstance(memory_type, list):
+        conditions.append({"memory_type": {"$in": memory_type}})
+    elif memory_type:
+        conditions.append({"memory_type": memory_type})
+    
+    if min_importance > 0:
+        conditions.append({"importance_score": {"$gte": min_importance}})
+    
+    # Use $and operator to combine conditions
+    return {"$and": conditions} if len(conditions) > 1 else _USER_WHERE
+
+# Facts, preferences and questions that make a user's input worth storing as a memory
+_VALUABLE_INPUT_RE = re.compile(
+    "|".join(re.escape(indicator) for indicator in (
+        "i am", "i'm", "my name is", "i work", "i live",  # Facts
+        "i prefer", "i like", "i want", "i need",  # Preferences
+        "how", "what", "why", "when", "where", "can you",  # Questions
+    )),
+    re.IGNORECASE,
+)
+
+def _sentences_matching(pattern: re.Pattern, text: str):
+    """Yield each full-stop delimited sentence of text that pattern matches in, found with
+    one scan of the text by widening every match out to the full stops around it"""
+    match = pattern.search(text)
+    while match:
+        start = text.rfind('.', 0, match.start()) + 1
+        end = text.find('.', match.end())
+        if end == -1:
+            end = len(text)
+        yield text[start:end]
+        
+        # Carry on after this sentence
+        match = pattern.search(text, end)
+
+# Content keywords behind memory tags and categories, matched anywhere in the text
+_INQUIRY_RE = re.compile("how|what|why|when|where", re.IGNORECASE)
+_PROBLEM_RE = re.compile("error|problem|issue|bug", re.IGNORECASE)
+_GRATITUDE_RE = re.compile("thanks|thank you|appreciate", re.IGNORECASE)
+_TROUBLESHOOTING_RE = re.compile("error|exception|failed|bug", re.IGNORECASE)
+_LEARNING_RE = re.compile("how to|example|tutorial", re.IGNORECASE)
+_STATED_PREFERENCE_RE = re.compile("i prefer|i like|i want", re.IGNORECASE)
+
+# Sections of a session's stored text, in order, each with how its session data value is written
+_SESSION_CONTENT_SECTIONS = (
+    ("summary", "Session Summary: {}".format),
+    ("topics", lambda topics: f"Topics Discussed: {', '.join(topics)}"),
+    ("key_interactions", lambda interactions: "\n".join(["Key Interactions:", *(f"- {i}" for i in interactions)])),
+    ("outcomes", "Session Outcomes: {}".format),
+)
+
+# Stand-in for an embedding Vertex AI failed to produce (text-embedding-005 dimension)
+def memory_content_hash(content: str) -> bytes:
+    """Compact digest of a memory's content, for spotting contents already stored"""
+    return hashlib.blake2b((content or "").encode(), digest_size=16).digest()
+
+_ZERO_EMBEDDING = np.zeros(768, dtype=np.float32)
+_ZERO_EMBEDDING.flags.writeable = False
+
 class JarvisMemoryService:
+    # Most texts Vertex AI embeds in a single request
+    EMBEDDING_BATCH_SIZE = 250
+    # Texts to embed are collected for at most this long (seconds) after the first,
+    # so concurrent callers share requests
+    EMBEDDING_BATCH_WINDOW = 0.01
+    # store_memory calls are coalesced into one bulk store of up to this many memories,
+    # waiting at most this long (seconds) after the first for more to arrive
+    STORE_BATCH_SIZE = 128
+    STORE_BATCH_WINDOW = 0.05
+    # Embeddings kept in memory, keyed by a hash of the embedded text
+    EMBEDDING_CACHE_SIZE = 4096
+    # Shared by every instance in the process, as embeddings don't depend on the service
+    _embedding_cache: LRUCache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+    # search_memories results kept for repeated queries, cleared whenever the collection changes
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_TTL = 60
+    # Inner product of two query embeddings above which they share cached results
+    SEARCH_CACHE_SIMILARITY = 0.95
+    # Threads the blocking ChromaDB calls run on, so they don't stall the event loop
+    CHROMA_WORKERS = 8
+    # Seconds between cleanups of old memories, each started by the first store after the last
+    CLEANUP_INTERVAL = 3600
+    
     def __init__(self, db_session: DBSession, collection_name: str = "jarvis_memory"):
         self.db = db_session
         self.logger = logging.getLogger(__name__)
         self.collection_name = collection_name
         
+        # Texts queued or being embedded, each with the future its embedding is delivered to.
+        # Like the queue and its worker, the futures belong to an event loop, so all three
+        # are created on the loop of the first call, and again if another loop takes over
+        self._pending_embeddings: Dict[bytes, asyncio.Future] = {}
+        self._embedding_queue: Optional[asyncio.Queue] = None
+        self._embedding_worker: Optional[asyncio.Task] = None
+        
+        self._search_cache: TTLCache = TTLCache(maxsize=self.SEARCH_CACHE_SIZE, ttl=self.SEARCH_CACHE_TTL)
+        # memory_type -> hashes of the stored contents of that type, loaded on first use
+        # and kept up to date by stores, so duplicate checks needn't read every memory
+        self._memory_hashes: Dict[str, set] = {}
+        # Bumped whenever the collection changes, so a search that was already running
+        # when the cache was cleared doesn't put its outdated results back
+        self._search_generation = 0
+        
+        # Pending store_memory calls, each with the future its memory ID is delivered to.
+        # The queue and its worker belong to an event loop, so they're created on the loop
+        # of the first call, and again if another loop takes over
+        self._store_queue: Optional[asyncio.Queue] = None
+        self._store_worker: Optional[asyncio.Task] = None
+        
+        self._chroma_pool = ThreadPoolExecutor(max_workers=self.CHROMA_WORKERS, thread_name_prefix="chroma")
+        
+        # Fire-and-forget tasks, referenced here until they finish so they aren't collected
+        self._background_tasks: set = set()
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._next_cleanup = 0.0  # time.monotonic() after which the next cleanup is due
+        
         # Initialize ChromaDB with proper settings
         persist_directory = os.path.abspath("./jarvis_memory_db")
         os.makedirs(persist_directory, exist_ok=True)
@@ -47,19 +180,36 @@ class JarvisMemoryService:
             try:
                 self.collection = self.chroma_client.create_collection(
                     name=collection_name,
-                    metadata={"description": "Jarvis long-term memory storage"}
+                    metadata={
+                        "description": "Jarvis long-term memory storage",
+                        # Embeddings are unit length, so inner product ranks like cosine
+                        # without normalizing vectors during the search
+                        "hnsw:space": "ip",
+                        # A denser graph and wider searches than the defaults keep recall
+                        # up as memories accumulate
+                        "hnsw:M": 32,
+                        "hnsw:construction_ef": 200,
+                        "hnsw:search_ef": 64,
+                        # Index a whole store_memory batch at once, and persist less often
+                        "hnsw:batch_size": self.STORE_BATCH_SIZE,
+                        "hnsw:sync_threshold": 1024
+                    }
                 )
                 self.logger.info(f"Created new memory collection: {collection_name}")
             except Exception as e:
                 self.logger.error(f"Error creating ChromaDB collection: {str(e)}")
                 raise
     
-    async def _get_embedding(self, text: str) -> List[float]:
+    async def _get_embedding(self, text: str) -> np.ndarray:
         """Get embedding using Vertex AI Text Embeddings"""
+        return (await self._get_embeddings([text]))[0]
+    
+    def _prepare_embedding_text(self, text: str) -> str:
+        """Normalize text for the embedding model, which rejects empty and very short inputs"""
         
         # Validate input text
         if not text or not text.strip():
-            # Return a default embedding for empty text
+            # Use a default embedding input for empty text
             self.logger.warning("Empty text provided for embedding, using default")
             text = "empty content"
         
@@ -67,17 +217,131 @@ class JarvisMemoryService:
         if len(text.strip()) < 3:
             text = f"short content: {text.strip()}"
         
+        return text.strip()
+    
+    async def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Get embeddings for several texts as the rows of a float32 array, from the cache
+        where possible and otherwise batched with other callers' texts, EMBEDDING_BATCH_SIZE
+        per Vertex AI request"""
+        prepared = [self._prepare_embedding_text(text) for text in texts]
+        keys = [hashlib.blake2b(text.encode(), digest_size=16).digest() for text in prepared]
+        
+        embeddings = {key: self._embedding_cache[key] for key in keys if key in self._embedding_cache}
+        
+        loop = asyncio.get_running_loop()
+        if self._embedding_worker is None or self._embedding_worker.get_loop() is not loop:
+            self._pending_embeddings = {}
+            self._embedding_queue = asyncio.Queue()
+            self._embedding_worker = None
+        
+        pending = {}
+        for key, text in zip(keys, prepared):
+            if key in embeddings or key in pending:
+                continue
+            # Texts already queued or being embedded are waited for rather than requested again
+            future = self._pending_embeddings.get(key)
+            if future is None or future.done():
+                future = self._pending_embeddings[key] = loop.create_future()
+                self._embedding_queue.put_nowait((key, text))
+            pending[key] = future
+        
+        if pending:
+            if self._embedding_worker is None or self._embedding_worker.done():
+                self._embedding_worker = loop.create_task(self._embedding_request_worker(self._embedding_queue))
+            for key, future in pending.items():
+                # Shielded, so a cancelled caller doesn't cancel the result for the others
+                embeddings[key] = await asyncio.shield(future)
+        
+        return np.stack([embeddings[key] for key in keys])
+    
+    async def _embedding_request_worker(self, queue: asyncio.Queue):
+        """Embed queued texts together, waiting at most EMBEDDING_BATCH_WINDOW seconds
+        after the first one for more to arrive"""
+        loop = asyncio.get_running_loop()
+        while True:
+            key, text = await queue.get()
+            batch = {key: text}
+            try:
+                deadline = loop.time() + self.EMBEDDING_BATCH_WINDOW
+                while len(batch) < self.EMBEDDING_BATCH_SIZE:
+                    try:
+                        key, text = await asyncio.wait_for(queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    batch[key] = text
+            except BaseException:
+                # Texts taken off the queue would otherwise stay pending for good
+                self._deliver_embeddings(batch, {})
+                raise
+            
+            # Anything queued behind a full batch goes out in the same round of requests
+            while not queue.empty():
+                key, text = queue.get_nowait()
+                batch[key] = text
+            
+            # Requested in the background, so the next batch is collected meanwhile
+            self._run_in_background(self._embed_batch(batch))
+    
+    async def _embed_batch(self, batch: Dict[bytes, str]):
+        """Embed a batch of queued texts and deliver each result to its waiting callers"""
+        embeddings = {}
         try:
-            text_input = TextEmbeddingInput(
-                text=text.strip(),
-                task_type="RETRIEVAL_DOCUMENT"  # Using RETRIEVAL_DOCUMENT since we're storing text for later retrieval
-            )
-            embeddings = self.embedding_model.get_embeddings([text_input])
-            return embeddings[0].values
+            embeddings = await self._request_embeddings(batch)
         except Exception as e:
-            self.logger.error(f"Error generating embedding for text '{text[:50]}...': {str(e)}")
-            # Return a zero vector as fallback (this should match the embedding dimension)
-            return [0.0] * 768  # Default dimension for text-embedding-005
+            self.logger.error(f"Error embedding {len(batch)} queued texts: {str(e)}")
+        finally:
+            self._deliver_embeddings(batch, embeddings)
+    
+    def _deliver_embeddings(self, batch: Dict[bytes, str], embeddings: Dict[bytes, np.ndarray]):
+        """Resolve and forget the pending futures of a batch, with zero vectors for texts
+        that weren't embedded"""
+        for key in batch:
+            future = self._pending_embeddings.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(embeddings.get(key, _ZERO_EMBEDDING))
+    
+    async def _request_embeddings(self, missing: Dict[bytes, str]) -> Dict[bytes, np.ndarray]:
+        """Embed texts by cache key with Vertex AI, caching the results"""
+        embeddings = {}
+        missing_keys = list(missing)
+        
+        chunks = [
+            missing_keys[start:start + self.EMBEDDING_BATCH_SIZE]
+            for start in range(0, len(missing_keys), self.EMBEDDING_BATCH_SIZE)
+        ]
+        # The async client keeps the event loop free while Vertex AI embeds, and lets
+        # several chunks be in flight at once
+        responses = await asyncio.gather(
+            *(
+                self.embedding_model.get_embeddings_async([
+                    TextEmbeddingInput(
+                        text=missing[key],
+                        task_type="RETRIEVAL_DOCUMENT"  # Using RETRIEVAL_DOCUMENT since we're storing text for later retrieval
+                    )
+                    for key in chunk
+                ])
+                for chunk in chunks
+            ),
+            return_exceptions=True
+        )
+        
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, BaseException):
+                self.logger.error(f"Error generating embeddings for {len(chunk)} texts starting '{missing[chunk[0]][:50]}...': {str(response)}")
+                # Return zero vectors as fallback (this should match the embedding dimension), uncached
+                for key in chunk:
+                    embeddings[key] = _ZERO_EMBEDDING
+                continue
+            
+            vectors = np.asarray([embedding.values for embedding in response], dtype=np.float32)
+            # Normalize to unit length so the collection can compare them by inner product
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms > 0, norms, 1)
+            # Cache a copy of each row, so evicting it doesn't leave the whole chunk alive
+            for key, vector in zip(chunk, vectors):
+                embeddings[key] = self._embedding_cache[key] = vector.copy()
+        
+        return embeddings
     
     async def store_memory(
         self,
@@ -89,55 +353,126 @@ class JarvisMemoryService:
         tags: Union[List[str], str] = None,
         metadata: Dict[str, Any] = None
     ) -> str:
-        """Store a memory in the vector database with enhanced metadata"""
+        """Store a memory in the vector database with enhanced metadata.
         
-        # Generate unique ID for this memory
-        memory_id = str(uuid.uuid4())
+        Concurrent calls are stored together in one batch; returns the memory ID,
+        or None if it couldn't be stored.
+        """
+        loop = asyncio.get_running_loop()
+        if self._store_worker is None or self._store_worker.get_loop() is not loop:
+            self._store_queue = asyncio.Queue()
+            self._store_worker = None
+        if self._store_worker is None or self._store_worker.done():
+            self._store_worker = loop.create_task(self._store_memory_worker(self._store_queue))
         
-        # Create embedding using Vertex AI
-        embedding = await self._get_embedding(content)
+        stored = loop.create_future()
+        self._store_queue.put_nowait(({
+            "content": content,
+            "memory_type": memory_type,
+            "session_id": session_id,
+            "importance_score": importance_score,
+            "tags": tags,
+            "metadata": metadata
+        }, stored))
+        return await stored
+    
+    async def _store_memory_worker(self, queue: asyncio.Queue):
+        """Store queued memories in batches of up to STORE_BATCH_SIZE, waiting at most
+        STORE_BATCH_WINDOW seconds after the first one for the rest to arrive"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            memory_ids = []
+            # Every caller in the batch gets an answer, even if the worker is cancelled
+            try:
+                deadline = loop.time() + self.STORE_BATCH_WINDOW
+                while len(batch) < self.STORE_BATCH_SIZE:
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                
+                memory_ids = await self.store_memories_bulk(DEFAULT_USER_ID, [memory for memory, _ in batch])
+            except Exception as e:
+                self.logger.error(f"Error storing {len(batch)} queued memories: {str(e)}")
+            finally:
+                for index, (_, stored) in enumerate(batch):
+                    if not stored.done():  # The caller may have been cancelled
+                        stored.set_result(memory_ids[index] if memory_ids else None)
+    
+    async def store_memories_bulk(
+        self,
+        user_id: str,  # This will be ignored
+        memories: List[Dict[str, Any]]
+    ) -> List[str]:
+        """Store several memories with one ChromaDB add and one SQL insert.
         
-        # Generate a summary for long content
-        content_summary = await self._generate_content_summary(content) if len(content) > 200 else content
+        Each memory is a dict of store_memory's keyword arguments; only content
+        is required. Returns the new memory IDs, or [] if nothing was stored.
+        """
+        if not memories:
+            return []
         
-        # Convert tags to string if needed
-        tags_str = tags
-        if isinstance(tags, list):
-            tags_str = ", ".join(tags)
-        elif tags is None:
-            tags_str = ""
+        memory_ids = []
+        metadatas = []
+        memory_tag_names = []
+        memory_vectors = []
         
-        # Create memory metadata
-        memory_metadata = {
-            "user_id": DEFAULT_USER_ID,  # Always use default user
-            "memory_type": memory_type,
-            "session_id": session_id or "",
-            "importance_score": float(importance_score),
-            "timestamp": datetime.utcnow().isoformat(),
-            "tags": tags_str,
-            "content_length": len(content),
-            "has_summary": bool(content_summary != content),
-            "memory_category": self._determine_memory_category(content, memory_type)
-        }
+        # Create embeddings using Vertex AI, batched
+        embeddings = await self._get_embeddings([memory["content"] for memory in memories])
         
-        # Add additional metadata if provided
-        if metadata:
-            # Ensure all metadata values are primitive types
-            for key, value in metadata.items():
-                if isinstance(value, (str, int, float, bool)):
-                    memory_metadata[key] = value
+        # Memories stored together share a timestamp
+        timestamp = datetime.now(timezone.utc).isoformat()
         
-        # Store in ChromaDB
-        try:
-            self.collection.add(
-                embeddings=[embedding],
-                documents=[content],
-                metadatas=[memory_metadata],
-                ids=[memory_id]
-            )
+        for memory in memories:
+            content = memory["content"]
+            memory_type = memory.get("memory_type") or "conversation"
+            session_id = memory.get("session_id")
+            importance_score = memory.get("importance_score", 0.5)
+            tags = memory.get("tags")
+            
+            # Generate unique ID for this memory
+            memory_id = str(uuid.uuid4())
+            
+            # Generate a summary for long content
+            content_summary = await self._generate_content_summary(content) if len(content) > 200 else content
+            
+            # Convert tags to string if needed
+            tags_str = tags
+            if isinstance(tags, list):
+                tags_str = ", ".join(tags)
+            elif tags is None:
+                tags_str = ""
+            tag_names = [
+                name.strip() for name in (tags if isinstance(tags, list) else tags_str.split(","))
+                if name and name.strip()
+            ]
+            
+            # Create memory metadata
+            memory_metadata = {
+                "user_id": DEFAULT_USER_ID,  # Always use default user
+                "memory_type": memory_type,
+                "session_id": session_id or "",
+                "importance_score": float(importance_score),
+                "timestamp": timestamp,
+                "tags": tags_str,
+                "content_length": len(content),
+                # Content that needs no summary is passed through as the same object
+                "has_summary": content_summary is not content,
+                "memory_category": self._determine_memory_category(content, memory_type)
+            }
+            
+            # Add additional metadata if provided
+            if memory.get("metadata"):
+                # Ensure all metadata values are primitive types
+                for key, value in memory["metadata"].items():
+                    if isinstance(value, (str, int, float, bool)):
+                        memory_metadata[key] = value
             
-            # Store reference in SQL database
-            memory_vector = MemoryVector(
+            memory_ids.append(memory_id)
+            metadatas.append(memory_metadata)
+            memory_tag_names.append(tag_names)
+            memory_vectors.append(MemoryVector(
                 user_id=DEFAULT_USER_ID,  # Always use default user
                 session_id=session_id,
                 content=content,
@@ -145,26 +480,49 @@ class JarvisMemoryService:
                 vector_id=memory_id,
                 memory_type=memory_type,
                 importance_score=importance_score,
-                tags=tags,  # Store as list in SQL
                 metadata=memory_metadata
+            ))
+        
+        try:
+            # Store in ChromaDB
+            await self._run_chroma(
+                self.collection.add,
+                embeddings=embeddings,
+                documents=[memory["content"] for memory in memories],
+                metadatas=metadatas,
+                ids=memory_ids
             )
-            self.db.add(memory_vector)
-            
-            # Update related memories
-            await self._update_related_memories(memory_vector)
+            self._invalidate_search_cache()
             
-            # Cleanup old memories if needed
-            await self._cleanup_old_memories(DEFAULT_USER_ID)  # Always use default user
+            # Update related memories, searching with the embeddings just stored
+            await self._update_related_memories(memory_vectors, embeddings)
             
+            # Store references in SQL database
+            # One tag upsert for the whole batch rather than one per memory
+            tags_by_name = {
+                tag.name: tag
+                for tag in get_or_create_tags(self.db, chain.from_iterable(memory_tag_names))
+            }
+            for memory_vector, tag_names in zip(memory_vectors, memory_tag_names):
+                memory_vector.tags = [tags_by_name[name] for name in dict.fromkeys(tag_names)]
+            stored_contents = [(memory_vector.memory_type, memory_vector.content) for memory_vector in memory_vectors]
+            self.db.add_all(memory_vectors)
             self.db.commit()
-            self.logger.info(f"Stored memory {memory_id} for default user")
+            self.logger.info(f"Stored {len(memory_ids)} memories for default user")
+            
+            for memory_type, content in stored_contents:
+                if memory_type in self._memory_hashes:
+                    self._memory_hashes[memory_type].add(memory_content_hash(content))
+            
+            # Cleanup old memories if due, without holding up the store
+            self._schedule_cleanup()
             
-            return memory_id
+            return memory_ids
             
         except Exception as e:
-            self.logger.error(f"Error storing memory: {str(e)}")
+            self.logger.error(f"Error storing memories: {str(e)}")
             self.db.rollback()
-            return None
+            return []
     
     def _calculate_memory_importance(
         self,
@@ -204,13 +562,15 @@ class JarvisMemoryService:
         if len(content) <= 200:
             return content
             
-        # Simple extractive summarization
-        sentences = content.split('.')
-        if len(sentences) <= 2:
+        # Simple extractive summarization, locating just the sentences it needs
+        first_end = content.find('.')
+        last_end = content.rfind('.')
+        if first_end == last_end:  # Fewer than two full stops
             return content
+        last_start = content.rfind('.', 0, last_end) + 1
             
         # Take first and last meaningful sentences
-        summary = f"{sentences[0].strip()}... {sentences[-2].strip()}"
+        summary = f"{content[:first_end].strip()}... {content[last_start:last_end].strip()}"
         return summary[:200] + "..." if len(summary) > 200 else summary
     
     async def _enhance_memory_tags(self, content: str, existing_tags: List[str]) -> List[str]:
@@ -220,60 +580,66 @@ class JarvisMemoryService:
         # Add content-based tags
         if "?" in content:
             tags.add("question")
-        if any(word in content.lower() for word in ["how", "what", "why", "when", "where"]):
+        if _INQUIRY_RE.search(content):
             tags.add("inquiry")
-        if any(word in content.lower() for word in ["error", "problem", "issue", "bug"]):
+        if _PROBLEM_RE.search(content):
             tags.add("troubleshooting")
-        if any(word in content.lower() for word in ["thanks", "thank you", "appreciate"]):
+        if _GRATITUDE_RE.search(content):
             tags.add("gratitude")
         
         return list(tags)
     
     def _determine_memory_category(self, content: str, memory_type: str) -> str:
         """Determine the category of a memory based on its content and type"""
-        content = content.lower()
-        
         if memory_type == "session_summary":
             return "session"
         
-        if any(word in content for word in ["error", "exception", "failed", "bug"]):
+        if _TROUBLESHOOTING_RE.search(content):
             return "troubleshooting"
         
-        if any(word in content for word in ["how to", "example", "tutorial"]):
+        if _LEARNING_RE.search(content):
             return "learning"
         
-        if "preference" in memory_type or any(word in content for word in ["i prefer", "i like", "i want"]):
+        if "preference" in memory_type or _STATED_PREFERENCE_RE.search(content):
             return "preference"
         
         return "general"
     
-    async def _update_related_memories(self, memory: MemoryVector):
-        """Update relationships between related memories"""
+    async def _update_related_memories(self, memories: List[MemoryVector], embeddings: np.ndarray):
+        """Update relationships between related memories, given the memories' embeddings"""
         try:
-            # Search for related memories
-            embedding = await self._get_embedding(memory.content)
-            results = self.collection.query(
-                query_embeddings=[embedding],
+            # Search for the memories related to each of them with one query
+            results = await self._run_chroma(
+                self.collection.query,
+                query_embeddings=embeddings,
                 n_results=5,
-                where={"user_id": memory.user_id}
+                where=_USER_WHERE
             )
             
             if not results or not results.get("ids"):
                 return
             
-            # Get related memory IDs
-            related_ids = results["ids"][0]
+            # Count the related memories, one access for each memory they're related to
+            accesses = Counter(
+                vector_id
+                for memory, related_ids in zip(memories, results["ids"])
+                for vector_id in related_ids
+                if vector_id != memory.vector_id  # Don't update the current memory
+            )
             
-            # Update access count for related memories
-            for vector_id in related_ids:
-                if vector_id != memory.vector_id:  # Don't update the current memory
-                    related_memory = self.db.query(MemoryVector).filter(
-                        MemoryVector.vector_id == vector_id
-                    ).first()
-                    
-                    if related_memory:
-                        related_memory.access_count += 1
-                        related_memory.last_accessed = datetime.utcnow()
+            # Update access counts with one UPDATE per distinct increment, usually just one
+            related_ids_by_count = defaultdict(list)
+            for vector_id, count in accesses.items():
+                related_ids_by_count[count].append(vector_id)
+            
+            current_time = datetime.now(timezone.utc)
+            for count, related_ids in related_ids_by_count.items():
+                self.db.query(MemoryVector).filter(
+                    MemoryVector.vector_id.in_(related_ids)
+                ).update({
+                    MemoryVector.access_count: MemoryVector.access_count + count,
+                    MemoryVector.last_accessed: current_time
+                }, synchronize_session=False)
             
             self.db.commit()
             
@@ -288,23 +654,32 @@ class JarvisMemoryService:
             retention_days = 90  # TODO: Get from user preferences
             
             # Calculate cutoff date
-            cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
+            cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
             
             # Find old memories with low importance
-            old_memories = self.db.query(MemoryVector).filter(
-                MemoryVector.user_id == user_id,
-                MemoryVector.created_at < cutoff_date,
-                MemoryVector.importance_score < 0.3,
-                MemoryVector.access_count < 2
-            ).all()
-            
-            # Delete from both databases
-            for memory in old_memories:
-                try:
-                    self.collection.delete(ids=[memory.vector_id])
-                    self.db.delete(memory)
-                except Exception as e:
-                    self.logger.warning(f"Error deleting memory {memory.vector_id}: {str(e)}")
+            vector_ids = list(self.db.scalars(
+                select(MemoryVector.vector_id).where(
+                    MemoryVector.user_id == user_id,
+                    MemoryVector.created_at < cutoff_date,
+                    MemoryVector.importance_score < 0.3,
+                    MemoryVector.access_count < 2
+                )
+            ))
+            if not vector_ids:
+                return
+            
+            # Delete from both databases, each with a single call
+            await self._run_chroma(self.collection.delete, ids=vector_ids)
+            self._invalidate_search_cache()
+            self._memory_hashes.clear()  # Reloaded without the deleted contents when next needed
+            # Bulk deletes skip the ORM's cleanup of the tag links, and SQLite doesn't
+            # enforce their ON DELETE CASCADE, so remove those rows explicitly
+            self.db.execute(delete(memory_tags).where(memory_tags.c.memory_id.in_(
+                select(MemoryVector.id).where(MemoryVector.vector_id.in_(vector_ids))
+            )))
+            self.db.query(MemoryVector).filter(
+                MemoryVector.vector_id.in_(vector_ids)
+            ).delete(synchronize_session=False)
             
             self.db.commit()
             
@@ -317,34 +692,42 @@ class JarvisMemoryService:
         user_id: str,  # This will be ignored
         query: str,
         limit: int = 10,
-        memory_type: Optional[str] = None,
+        memory_type: Optional[Union[str, List[str]]] = None,
         min_importance: float = 0.0
     ) -> List[Dict[str, Any]]:
-        """Search for relevant memories using semantic similarity"""
+        """Search for relevant memories using semantic similarity, optionally of one
+        memory type or any of a list of them"""
         try:
             # Log the search request
             self.logger.info(f"Searching memories with query: '{query}', type: {memory_type}, min_importance: {min_importance}")
             
+            # Repeated searches are answered from the cache
+            generation = self._search_generation
+            filters = f"{limit}|{memory_type}|{min_importance}"
+            cache_key = hashlib.blake2b(f"{query}|{filters}".encode(), digest_size=16).digest()
+            cached = self._search_cache.get(cache_key)
+            if cached is not None:
+                return self._cached_search_results(cached)
+            
             # Get embedding for query
             query_embedding = await self._get_embedding(query)
             self.logger.debug(f"Generated embedding for query: {query[:50]}...")
             
-            # Build where clause with proper operator syntax
-            conditions = []
-            conditions.append({"user_id": DEFAULT_USER_ID})
+            # So are searches with the same filters for a query meaning nearly the same
+            similar = [entry for entry in self._search_cache.values() if entry[0] == filters]
+            if similar:
+                similarities = np.stack([entry[1] for entry in similar]) @ query_embedding
+                best = int(similarities.argmax())
+                if similarities[best] >= self.SEARCH_CACHE_SIMILARITY:
+                    self.logger.debug(f"Answering query from a cached search {similarities[best]:.3f} similar")
+                    return self._cached_search_results(similar[best])
             
-            if memory_type:
-                conditions.append({"memory_type": memory_type})
-            
-            if min_importance > 0:
-                conditions.append({"importance_score": {"$gte": min_importance}})
-            
-            # Use $and operator to combine conditions
-            where = {"$and": conditions} if len(conditions) > 1 else conditions[0]
+            where = _search_where(memory_type, min_importance)
             self.logger.debug(f"Search filters: {where}")
             
             # Search in ChromaDB with increased limit for better recall
-            results = self.collection.query(
+            results = await self._run_chroma(
+                self.collection.query,
                 query_embeddings=[query_embedding],
                 n_results=min(limit * 2, 20),  # Double the requested limit but cap at 20
                 where=where
@@ -353,13 +736,15 @@ class JarvisMemoryService:
             self.logger.debug(f"Raw search results: {results}")
             
             memories = []
+            accessed_ids = []
             if not results or not results.get("documents"):
                 self.logger.warning(f"No results found for query: {query}")
                 # Try a fallback search without memory type filter if no results
                 if memory_type:
                     self.logger.info("Attempting fallback search without memory type filter")
-                    where = {"user_id": DEFAULT_USER_ID}  # Only keep user filter
-                    results = self.collection.query(
+                    where = _USER_WHERE  # Only keep user filter
+                    results = await self._run_chroma(
+                        self.collection.query,
                         query_embeddings=[query_embedding],
                         n_results=min(limit * 2, 20),
                         where=where
@@ -374,7 +759,7 @@ class JarvisMemoryService:
                     results["metadatas"][0]
                 )):
                     # Calculate similarity score - if distances not available, use a default high score
-                    similarity = 1 - distances[idx] if distances else 0.8
+                    similarity = self._distance_to_similarity(distances[idx]) if distances else 0.8
                     
                     # Log the match details
                     self.logger.debug(f"Memory match: similarity={similarity:.3f}, type={metadata.get('memory_type')}")
@@ -396,19 +781,99 @@ class JarvisMemoryService:
                 memories.sort(key=lambda x: x["relevance_score"], reverse=True)
                 memories = memories[:limit]
                 
-                # Update access count for retrieved memories
+                # Update access count for retrieved memories, without holding up the results
                 if results.get("ids"):
-                    await self._update_memory_access(results["ids"][0][:len(memories)])
+                    accessed_ids = results["ids"][0][:len(memories)]
+                    self._run_in_background(self._update_memory_access(accessed_ids))
                 
                 self.logger.info(f"Retrieved {len(memories)} memories with relevance scores: " + 
                                ", ".join([f"{m['relevance_score']:.2f}" for m in memories]))
             
+            if generation == self._search_generation:
+                self._search_cache[cache_key] = (
+                    filters, query_embedding, accessed_ids, [dict(memory) for memory in memories]
+                )
             return memories
             
         except Exception as e:
             self.logger.error(f"Error searching memories: {str(e)}", exc_info=True)
             return []
     
+    def _invalidate_search_cache(self):
+        """Forget cached searches after the collection changes"""
+        self._search_cache.clear()
+        self._search_generation += 1
+    
+    def _cached_search_results(self, entry: Tuple) -> List[Dict[str, Any]]:
+        """Results of a cached search, still counting as an access of the memories found"""
+        _, _, accessed_ids, memories = entry
+        if accessed_ids:
+            self._run_in_background(self._update_memory_access(accessed_ids))
+        return [dict(memory) for memory in memories]
+    
+    def _distance_to_similarity(self, distance: float) -> float:
+        """Similarity score for a collection query distance.
+        
+        Scores keep the scale the relevance thresholds were tuned on, one minus the
+        squared L2 distance between unit vectors, whichever space the collection uses.
+        For unit vectors that squared distance is twice the inner product distance.
+        """
+        if (self.collection.metadata or {}).get("hnsw:space") == "ip":
+            return 1 - 2 * distance
+        return 1 - distance
+    
+    async def get_memories_by_tags(
+        self,
+        user_id: str,  # This will be ignored
+        tags: List[str],
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Get memories carrying any of the given tags, most important first"""
+        query = (
+            select(MemoryVector)
+            .join(MemoryVector.tags)
+            .where(MemoryVector.user_id == DEFAULT_USER_ID, Tag.name.in_(tags))
+            .options(selectinload(MemoryVector.tags))
+            .distinct()
+            .order_by(desc(MemoryVector.importance_score))
+            .limit(limit)
+        )
+        
+        return [
+            {
+                "content": memory.content,
+                "memory_type": memory.memory_type,
+                "importance_score": memory.importance_score,
+                "timestamp": memory.created_at.isoformat() if memory.created_at else None,
+                "tags": [tag.name for tag in memory.tags]
+            }
+            for memory in self.db.scalars(query)
+        ]
+    
+    async def list_memory_hashes(
+        self,
+        user_id: str,  # This will be ignored
+        memory_types: List[str]
+    ) -> Dict[str, set]:
+        """Get memory_content_hash of every stored memory's content, by memory type.
+        
+        Each type is read from the database once, after which stores keep its set up
+        to date; the sets are shared, so callers must not change them.
+        """
+        missing = [memory_type for memory_type in memory_types if memory_type not in self._memory_hashes]
+        if missing:
+            hashes = {memory_type: set() for memory_type in missing}
+            for memory_type, content in self.db.execute(
+                select(MemoryVector.memory_type, MemoryVector.content).where(
+                    MemoryVector.user_id == DEFAULT_USER_ID,
+                    MemoryVector.memory_type.in_(missing)
+                )
+            ):
+                hashes[memory_type].add(memory_content_hash(content))
+            self._memory_hashes.update(hashes)
+        
+        return {memory_type: self._memory_hashes[memory_type] for memory_type in memory_types}
+    
     async def get_contextual_memories(
         self,
         user_id: str,  # This will be ignored
@@ -444,32 +909,23 @@ class JarvisMemoryService:
         search_query = " ".join(context_elements) if context_elements else "general conversation"
         self.logger.info(f"Built context query: {search_query}")
         
-        # Try different memory types in priority order
-        memory_types = ["fact", "preference", "conversation"]
-        all_memories = []
-        
-        for memory_type in memory_types:
-            # Search with current memory type
-            memories = await self.search_memories(
-                user_id=DEFAULT_USER_ID,  # Always use default user
-                query=search_query,
-                limit=max_memories,
-                memory_type=memory_type,
-                min_importance=0.0  # No minimum importance to get more results
-            )
-            all_memories.extend(memories)
+        # Search all the relevant memory types at once; the most relevant of each type
+        # are among the most relevant overall, which is all that's kept below. Extra
+        # results are requested so max_memories remain once duplicates are dropped
+        all_memories = await self.search_memories(
+            user_id=DEFAULT_USER_ID,  # Always use default user
+            query=search_query,
+            limit=max_memories * 3,
+            memory_type=["fact", "preference", "conversation"],
+            min_importance=0.0  # No minimum importance to get more results
+        )
         
-        # Deduplicate memories based on content
-        seen_contents = set()
-        unique_memories = []
+        # Deduplicate memories based on content; search_memories has already sorted them
+        # by relevance, so the first of each is kept, then the max_memories most relevant
+        unique_by_content = {}
         for memory in all_memories:
-            if memory["content"] not in seen_contents:
-                seen_contents.add(memory["content"])
-                unique_memories.append(memory)
-        
-        # Sort by relevance and limit
-        unique_memories.sort(key=lambda x: x["relevance_score"], reverse=True)
-        unique_memories = unique_memories[:max_memories]
+            unique_by_content.setdefault(memory["content"], memory)
+        unique_memories = list(unique_by_content.values())[:max_memories]
         
         # Categorize memories by type
         categorized_memories = {
@@ -519,98 +975,134 @@ class JarvisMemoryService:
         topics = session_data.get("topics", [])
         tools_used = session_data.get("tools_used", [])
         
-        # Check if similar session summary exists
-        existing_summaries = await self.search_memories(
-            user_id=user_id,
-            query=session_content,
-            memory_type="session_summary",
-            limit=1
+        # Pick out the significant individual interactions worth storing
+        candidates = {}  # content -> interaction it came from, first occurrence wins
+        for interaction in session_data.get("interactions", []):
+            # Only store high-importance interactions
+            if interaction.get("importance_score", 0) > 0.5:  # Increased threshold
+                # Extract key information
+                user_input = interaction['user_input']
+                
+                # Only store the parts that contain valuable information
+                relevant_sentences = [
+                    sentence.strip() for sentence in _sentences_matching(_VALUABLE_INPUT_RE, user_input)
+                ]
+                if relevant_sentences:
+                    candidates.setdefault("\n".join(relevant_sentences), interaction)
+        
+        # Check for similar existing session summaries and interactions concurrently,
+        # the interactions with one batched lookup
+        existing_summaries, interaction_similarities = await asyncio.gather(
+            self.search_memories(
+                user_id=user_id,
+                query=session_content,
+                memory_type="session_summary",
+                limit=1
+            ),
+            self._nearest_similarities(list(candidates))
         )
         
+        # Memories worth keeping are stored together, so their embeddings come from one request
+        to_store = []
+        
         # Only store if it's not too similar to existing summaries
         if not existing_summaries or all(
             memory["relevance_score"] < 0.8 for memory in existing_summaries
         ):
             # Store main session memory with higher importance
-            await self.store_memory(
-                user_id=user_id,
-                content=session_content,
-                memory_type="session_summary",
-                session_id=session_id,
-                importance_score=0.8,  # High importance for session summaries
-                tags=topics + tools_used + ["session_summary"],
-                metadata={
+            to_store.append({
+                "content": session_content,
+                "memory_type": "session_summary",
+                "session_id": session_id,
+                "importance_score": 0.8,  # High importance for session summaries
+                "tags": topics + tools_used + ["session_summary"],
+                "metadata": {
                     "session_length": session_data.get("session_length", 0),
                     "tools_used": tools_used,
                     "outcomes": session_data.get("outcomes", []),
                     "interaction_count": len(session_data.get("interactions", [])),
                     "memory_type": "session_summary"
                 }
-            )
+            })
         
         # Store significant individual interactions
-        if "interactions" in session_data:
-            for interaction in session_data["interactions"]:
-                # Only store high-importance interactions
-                if interaction.get("importance_score", 0) > 0.5:  # Increased threshold
-                    # Extract key information
-                    user_input = interaction['user_input']
-                    agent_response = interaction['agent_response']
-                    
-                    # Only store if it contains valuable information
-                    if any(indicator in user_input.lower() for indicator in [
-                        "i am", "i'm", "my name is", "i work", "i live",  # Facts
-                        "i prefer", "i like", "i want", "i need",  # Preferences
-                        "how", "what", "why", "when", "where", "can you"  # Questions
-                    ]):
-                        # Extract the relevant part
-                        sentences = user_input.split('.')
-                        relevant_sentences = []
-                        for sentence in sentences:
-                            if any(indicator in sentence.lower() for indicator in [
-                                "i am", "i'm", "my name is", "i work", "i live",
-                                "i prefer", "i like", "i want", "i need",
-                                "how", "what", "why", "when", "where", "can you"
-                            ]):
-                                relevant_sentences.append(sentence.strip())
-                        
-                        if relevant_sentences:
-                            interaction_content = "\n".join(relevant_sentences)
-                            
-                            # Check if similar content exists
-                            existing_memories = await self.search_memories(
-                                user_id=user_id,
-                                query=interaction_content,
-                                limit=1
-                            )
-                            
-                            # Only store if not duplicate
-                            if not existing_memories or all(
-                                memory["relevance_score"] < 0.8 for memory in existing_memories
-                            ):
-                                # Extract potential preferences
-                                preferences = self._extract_preferences_from_text(interaction_content)
-                                
-                                # Add preference tags if found
-                                tags = interaction.get("tools_used", []) + ["interaction"]
-                                if preferences:
-                                    tags.extend([f"preference:{p}" for p in preferences])
-                                
-                                await self.store_memory(
-                                    user_id=user_id,
-                                    content=interaction_content,
-                                    memory_type="conversation",
-                                    session_id=session_id,
-                                    importance_score=max(0.6, interaction.get("importance_score", 0.5)),
-                                    tags=tags,
-                                    metadata={
-                                        "interaction_timestamp": interaction.get("timestamp"),
-                                        "memory_type": "conversation",
-                                        "interaction_type": "dialogue",
-                                        "preferences_found": preferences,
-                                        "tools_used": interaction.get("tools_used", [])
-                                    }
-                                )
+        for (interaction_content, interaction), similarity in zip(candidates.items(), interaction_similarities):
+            # Only store if not duplicate
+            if similarity < 0.8:
+                # Extract potential preferences
+                preferences = self._extract_preferences_from_text(interaction_content)
+                
+                # Add preference tags if found
+                tags = interaction.get("tools_used", []) + ["interaction"]
+                if preferences:
+                    tags.extend([f"preference:{p}" for p in preferences])
+                
+                to_store.append({
+                    "content": interaction_content,
+                    "memory_type": "conversation",
+                    "session_id": session_id,
+                    "importance_score": max(0.6, interaction.get("importance_score", 0.5)),
+                    "tags": tags,
+                    "metadata": {
+                        "interaction_timestamp": interaction.get("timestamp"),
+                        "memory_type": "conversation",
+                        "interaction_type": "dialogue",
+                        "preferences_found": preferences,
+                        "tools_used": interaction.get("tools_used", [])
+                    }
+                })
+        
+        await self.store_memories_bulk(user_id=user_id, memories=to_store)
+    
+    async def _nearest_similarities(self, texts: List[str]) -> List[float]:
+        """Similarity of each text to its closest stored memory or earlier text in the list,
+        0.0 when there is none"""
+        if not texts:
+            return []
+        
+        try:
+            embeddings = await self._get_embeddings(texts)
+            results = await self._run_chroma(
+                self.collection.query,
+                query_embeddings=embeddings,
+                n_results=1,
+                where=_USER_WHERE
+            )
+            stored = np.array([
+                self._distance_to_similarity(distances[0]) if distances else 0.0
+                for distances in (results.get("distances") or [[] for _ in texts])
+            ])
+            
+            # Texts stored together are not in the collection yet, so compare them with
+            # each other in one matmul, on the same scale as _distance_to_similarity
+            earlier = np.tril(2 * (embeddings @ embeddings.T) - 1, k=-1)
+            return np.maximum(stored, earlier.max(axis=1)).tolist()
+        except Exception as e:
+            self.logger.warning(f"Error checking {len(texts)} memories for duplicates: {str(e)}")
+            return [0.0] * len(texts)
+    
+    async def _run_chroma(self, method, **kwargs):
+        """Call a blocking collection method on the ChromaDB thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._chroma_pool, functools.partial(method, **kwargs)
+        )
+    
+    def _run_in_background(self, coroutine) -> asyncio.Task:
+        """Run a coroutine without waiting for it to finish"""
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    def _schedule_cleanup(self):
+        """Start cleaning up old memories in the background, if due and not already running"""
+        if time.monotonic() < self._next_cleanup or (self._cleanup_task and not self._cleanup_task.done()):
+            return
+        
+        self._next_cleanup = time.monotonic() + self.CLEANUP_INTERVAL
+        self._cleanup_task = self._run_in_background(
+            self._cleanup_old_memories(DEFAULT_USER_ID)  # Always use default user
+        )
     
     async def _update_memory_access(self, memory_ids: List[str]):
         """Update access count and last accessed time for memories"""
@@ -618,13 +1110,13 @@ class JarvisMemoryService:
             return
             
         try:
-            memory_vectors = self.db.query(MemoryVector).filter(
+            # One UPDATE for all of them, incremented by the database
+            self.db.query(MemoryVector).filter(
                 MemoryVector.vector_id.in_(memory_ids)
-            ).all()
-            
-            for memory in memory_vectors:
-                memory.access_count += 1
-                memory.last_accessed = datetime.utcnow()
+            ).update({
+                MemoryVector.access_count: MemoryVector.access_count + 1,
+                MemoryVector.last_accessed: datetime.now(timezone.utc)
+            }, synchronize_session=False)
             
             self.db.commit()
         except Exception as e:
@@ -633,51 +1125,40 @@ class JarvisMemoryService:
     
     def _create_session_content(self, session_data: Dict[str, Any]) -> str:
         """Create a comprehensive text representation of session data"""
-        content_parts = []
-        
-        if "summary" in session_data:
-            content_parts.append(f"Session Summary: {session_data['summary']}")
-        
-        if "topics" in session_data:
-            content_parts.append(f"Topics Discussed: {', '.join(session_data['topics'])}")
-        
-        if "key_interactions" in session_data:
-            content_parts.append("Key Interactions:")
-            for interaction in session_data["key_interactions"]:
-                content_parts.append(f"- {interaction}")
-        
-        if "outcomes" in session_data:
-            content_parts.append(f"Session Outcomes: {session_data['outcomes']}")
-        
-        return "\n".join(content_parts)
+        return "\n".join(
+            format_section(session_data[key])
+            for key, format_section in _SESSION_CONTENT_SECTIONS
+            if key in session_data
+        )
     
     async def _generate_context_summary(self, memories: List[Dict[str, Any]]) -> str:
         """Generate a summary of retrieved memories for context"""
         if not memories:
             return "No relevant context from previous interactions."
         
-        # Group memories by type and importance
-        high_importance = [m for m in memories if m.get("importance_score", 0) > 0.7]
-        recent_conversations = [m for m in memories if m.get("memory_type") == "conversation"]
+        # Count memories by type and importance, and their themes, in one pass
+        high_importance = 0
+        recent_conversations = 0
+        tag_counts = Counter()
+        for memory in memories:
+            if memory.get("importance_score", 0) > 0.7:
+                high_importance += 1
+            if memory.get("memory_type") == "conversation":
+                recent_conversations += 1
+            tag_counts.update(memory.get("tags", []))
         
         summary_parts = []
         
         if high_importance:
-            summary_parts.append(f"Important context: {len(high_importance)} significant past interactions")
+            summary_parts.append(f"Important context: {high_importance} significant past interactions")
         
         if recent_conversations:
-            summary_parts.append(f"Recent conversations covered: {len(recent_conversations)} related topics")
+            summary_parts.append(f"Recent conversations covered: {recent_conversations} related topics")
         
         # Extract common themes
-        all_tags = []
-        for memory in memories:
-            all_tags.extend(memory.get("tags", []))
-        
-        if all_tags:
-            from collections import Counter
-            common_tags = Counter(all_tags).most_common(3)
-            if common_tags:
-                summary_parts.append(f"Common themes: {', '.join([tag for tag, _ in common_tags])}")
+        common_tags = tag_counts.most_common(3)
+        if common_tags:
+            summary_parts.append(f"Common themes: {', '.join([tag for tag, _ in common_tags])}")
         
         return ". ".join(summary_parts) if summary_parts else "Limited relevant context available."
     
@@ -685,28 +1166,19 @@ class JarvisMemoryService:
         """Extract potential preferences from memory content"""
         preferences = []
         
-        preference_indicators = [
-            "I prefer", "I like", "I always", "I usually", "I want",
-            "I need", "My favorite", "I don't like", "I hate"
-        ]
-        
         for memory in memories:
-            content = memory.get("content", "").lower()
-            for indicator in preference_indicators:
-                if indicator.lower() in content:
-                    # Extract the sentence containing the preference
-                    sentences = content.split('.')
-                    for sentence in sentences:
-                        if indicator.lower() in sentence:
-                            preferences.append({
-                                "text": sentence.strip(),
-                                "confidence": memory.get("importance_score", 0.5),
-                                "source": "memory_analysis",
-                                "timestamp": memory.get("timestamp")
-                            })
-                            break
-        
-        return preferences[:5]  # Return top 5 potential preferences
+            # Extract the sentences containing a preference
+            for sentence in _sentences_matching(_PREFERENCE_INDICATOR_RE, memory.get("content", "")):
+                preferences.append({
+                    "text": sentence.strip().lower(),
+                    "confidence": memory.get("importance_score", 0.5),
+                    "source": "memory_analysis",
+                    "timestamp": memory.get("timestamp")
+                })
+                if len(preferences) >= 5:
+                    return preferences
+        
+        return preferences
     
     def _extract_preferences_from_text(self, text: str) -> List[str]:
         """Extract potential user preferences from text"""
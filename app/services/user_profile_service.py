@@ -1,43 +1,97 @@
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
-from datetime import datetime
-from sqlalchemy.orm import Session as DBSession
-from sqlalchemy import and_, desc
-from app.models.database import UserProfile, UserPreference, LifeEvent, SessionHistory, SessionInteraction
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session as DBSession, selectinload
+from sqlalchemy import and_, desc, select
+from app.models.database import UserProfile, UserPreference, LifeEvent, SessionHistory, SessionInteraction, get_or_create_tags, bulk_log_interactions
 from app.config.constants import DEFAULT_USER_ID
 
 class UserProfileService:
+    # Seconds a loaded profile and its preferences are served from memory
+    PROFILE_CACHE_TTL = 60
+    
     def __init__(self, db_session: DBSession):
         self.db = db_session
         self.logger = logging.getLogger(__name__)
+        
+        # user_id -> (expiry, (profile, preferences)); writes through this service invalidate it
+        self._profile_cache: Dict[str, Tuple[float, Tuple[Dict[str, Any], List[Dict[str, Any]]]]] = {}
+        self._profile_cache_lock = asyncio.Lock()
     
     async def get_user_profile(self, user_id: str) -> Dict[str, Any]:
         """Get complete user profile with preferences and statistics"""
+        profile, _ = await self.get_profile_and_preferences(user_id)
+        return profile
+    
+    async def get_profile_and_preferences(self, user_id: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Get the user profile together with all of its preferences
+        
+        Preferences are loaded alongside the profile instead of by a separate
+        query, and returned sorted by confidence like get_user_preferences.
+        Results are cached for PROFILE_CACHE_TTL seconds.
+        """
         # Always use default user ID
-        profile = self.db.query(UserProfile).filter(UserProfile.user_id == DEFAULT_USER_ID).first()
-        if not profile:
+        cached = self._profile_cache.get(DEFAULT_USER_ID)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        # Concurrent misses wait for a single load
+        async with self._profile_cache_lock:
+            cached = self._profile_cache.get(DEFAULT_USER_ID)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
+            result = await self._load_profile_and_preferences()
+            self._profile_cache[DEFAULT_USER_ID] = (time.monotonic() + self.PROFILE_CACHE_TTL, result)
+            return result
+    
+    def _invalidate_profile_cache(self):
+        """Drop the cached profile after it or its preferences change"""
+        self._profile_cache.pop(DEFAULT_USER_ID, None)
+    
+    async def _load_profile_and_preferences(self) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Load the profile and its preferences from the database"""
+        profile = self.db.scalars(
+            select(UserProfile)
+            .options(selectinload(UserProfile.preferences_records))
+            .where(UserProfile.user_id == DEFAULT_USER_ID)
+        ).first()
+        
+        if profile:
+            preferences = [
+                self._preference_to_dict(pref)
+                for pref in sorted(
+                    profile.preferences_records,
+                    key=lambda pref: pref.confidence_score or 0,
+                    reverse=True
+                )
+            ]
+        else:
             profile = await self.create_user_profile(DEFAULT_USER_ID)
+            preferences = []
         
-        # Get recent session count and preferences
+        # Get recent session count
         recent_sessions = self.db.query(SessionHistory).filter(
             SessionHistory.user_id == DEFAULT_USER_ID
         ).count()
         
-        preferences = await self.get_user_preferences(DEFAULT_USER_ID)
-        
         # Get recent life events
         recent_events = await self.get_life_events(DEFAULT_USER_ID, limit=5)
         
-        return {
+        # The JSON columns are MutableDicts tracked by the ORM row; cache plain copies so a
+        # caller changing the result can't write to the row when the session next commits
+        profile_data = {
             "user_id": DEFAULT_USER_ID,
-            "preferences": profile.preferences,
+            "preferences": dict(profile.preferences or {}),
             "interaction_stats": {
-                **profile.interaction_stats,
+                **(profile.interaction_stats or {}),
                 "total_sessions": recent_sessions,
                 "recent_preferences": [p for p in preferences if p["confidence"] > 0.7],
                 "recent_events": recent_events
             },
-            "communication_style": profile.communication_style,
+            "communication_style": dict(profile.communication_style or {}),
             "created_at": profile.created_at,
             "updated_at": profile.updated_at,
             "memory_settings": {
@@ -45,6 +99,7 @@ class UserProfileService:
                 "min_importance_threshold": profile.preferences.get("min_memory_importance", 0.3)
             }
         }
+        return profile_data, preferences
     
     async def create_user_profile(self, user_id: str) -> UserProfile:
         """Create a new user profile with default settings"""
@@ -78,30 +133,36 @@ class UserProfileService:
         )
         self.db.add(profile)
         self.db.commit()
+        self._invalidate_profile_cache()
         self.logger.info(f"Created new default user profile")
         return profile
     
     async def get_user_preferences(self, user_id: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get user preferences, optionally filtered by category"""
-        # Always use default user ID
-        query = self.db.query(UserPreference).filter(UserPreference.user_id == DEFAULT_USER_ID)
+        if not category:
+            _, preferences = await self.get_profile_and_preferences(user_id)
+            return preferences
         
-        if category:
-            query = query.filter(UserPreference.preference_category == category)
-            
-        preferences = query.order_by(desc(UserPreference.confidence_score)).all()
+        # Always use default user ID
+        preferences = self.db.query(UserPreference).filter(
+            and_(
+                UserPreference.user_id == DEFAULT_USER_ID,
+                UserPreference.preference_category == category
+            )
+        ).order_by(desc(UserPreference.confidence_score)).all()
         
-        return [
-            {
-                "key": pref.preference_key,
-                "value": pref.preference_value,
-                "confidence": pref.confidence_score,
-                "type": pref.preference_type,
-                "category": pref.preference_category,
-                "last_reinforced": pref.last_reinforced
-            }
-            for pref in preferences
-        ]
+        return [self._preference_to_dict(pref) for pref in preferences]
+    
+    def _preference_to_dict(self, pref: UserPreference) -> Dict[str, Any]:
+        """Convert a preference row to the dict shape returned by this service"""
+        return {
+            "key": pref.preference_key,
+            "value": pref.preference_value,
+            "confidence": pref.confidence_score,
+            "type": pref.preference_type,
+            "category": pref.preference_category,
+            "last_reinforced": pref.last_reinforced
+        }
     
     async def update_preference(
         self, 
@@ -113,76 +174,93 @@ class UserProfileService:
         category: str = "general"
     ):
         """Update or create a user preference with improved confidence handling"""
+        await self.update_preferences(user_id, [{
+            "key": key,
+            "value": value,
+            "preference_type": preference_type,
+            "confidence": confidence,
+            "category": category
+        }])
+    
+    async def update_preferences(self, user_id: str, preferences: List[Dict[str, Any]]):
+        """Update or create several user preferences with one lookup and one commit
+        
+        Each item takes the update_preference arguments: key and value, plus
+        optional preference_type, confidence and category.
+        """
+        if not preferences:
+            return
+        
         # Always use default user ID
-        existing = self.db.query(UserPreference).filter(
-            and_(
-                UserPreference.user_id == DEFAULT_USER_ID,
-                UserPreference.preference_key == key
+        keys = {pref["key"] for pref in preferences}
+        existing_by_key = {
+            existing.preference_key: existing
+            for existing in self.db.query(UserPreference).filter(
+                and_(
+                    UserPreference.user_id == DEFAULT_USER_ID,
+                    UserPreference.preference_key.in_(keys)
+                )
             )
-        ).first()
+        }
         
-        current_time = datetime.utcnow()
+        current_time = datetime.now(timezone.utc)
+        confidences = {}
         
-        if existing:
-            # Update existing preference with smarter confidence adjustment
-            if existing.preference_value == value:
-                # Reinforce existing preference
-                time_factor = min(1.0, (current_time - existing.last_reinforced).days / 30)
-                confidence_boost = 0.1 * time_factor
-                existing.confidence_score = min(1.0, existing.confidence_score + confidence_boost)
-            else:
-                # Update with new value, consider history
-                if existing.confidence_score > 0.8:
-                    # High confidence in old value, be conservative with change
-                    confidence = min(confidence, 0.7)
-                existing.preference_value = value
-                existing.confidence_score = confidence
-            
-            existing.preference_type = preference_type
-            existing.preference_category = category
-            existing.last_reinforced = current_time
+        for pref in preferences:
+            key = pref["key"]
+            value = pref["value"]
+            preference_type = pref.get("preference_type", "explicit")
+            confidence = pref.get("confidence", 1.0)
+            category = pref.get("category", "general")
+            existing = existing_by_key.get(key)
             
-            # Track preference history
-            history = existing.preference_history or []
-            history.append({
-                "old_value": existing.preference_value,
-                "new_value": value,
-                "timestamp": current_time.isoformat(),
-                "confidence": confidence,
-                "type": preference_type
-            })
-            existing.preference_history = history[-10:]  # Keep last 10 changes
+            if existing:
+                # Update existing preference with smarter confidence adjustment
+                if existing.preference_value == value:
+                    # Reinforce existing preference (SQLite loads timestamps as naive UTC datetimes)
+                    last_reinforced = existing.last_reinforced or current_time
+                    if last_reinforced.tzinfo is None:
+                        last_reinforced = last_reinforced.replace(tzinfo=timezone.utc)
+                    time_factor = min(1.0, (current_time - last_reinforced).days / 30)
+                    confidence_boost = 0.1 * time_factor
+                    existing.confidence_score = min(1.0, existing.confidence_score + confidence_boost)
+                else:
+                    # Update with new value, consider history
+                    if existing.confidence_score > 0.8:
+                        # High confidence in old value, be conservative with change
+                        confidence = min(confidence, 0.7)
+                    existing.preference_value = value
+                    existing.confidence_score = confidence
+                
+                existing.preference_type = preference_type
+                existing.preference_category = category
+                existing.last_reinforced = current_time
+                
+                self.logger.info(f"Updated preference {key} for default user (confidence: {existing.confidence_score:.2f})")
+            else:
+                existing_by_key[key] = UserPreference(
+                    user_id=DEFAULT_USER_ID,
+                    preference_key=key,
+                    preference_value=value,
+                    confidence_score=confidence,
+                    preference_type=preference_type,
+                    preference_category=category
+                )
+                self.db.add(existing_by_key[key])
+                self.logger.info(f"Created new preference {key} for default user")
             
-            self.logger.info(f"Updated preference {key} for default user (confidence: {existing.confidence_score:.2f})")
-        else:
-            new_pref = UserPreference(
-                user_id=DEFAULT_USER_ID,
-                preference_key=key,
-                preference_value=value,
-                confidence_score=confidence,
-                preference_type=preference_type,
-                preference_category=category,
-                preference_history=[{
-                    "value": value,
-                    "timestamp": current_time.isoformat(),
-                    "confidence": confidence,
-                    "type": preference_type
-                }]
-            )
-            self.db.add(new_pref)
-            self.logger.info(f"Created new preference {key} for default user")
+            confidences[key] = confidence
         
         # Update profile stats
         profile = self.db.query(UserProfile).filter(UserProfile.user_id == DEFAULT_USER_ID).first()
         if profile:
-            stats = profile.interaction_stats
-            preference_confidence = stats.get("preference_confidence", {})
-            preference_confidence[key] = confidence
-            stats["preference_confidence"] = preference_confidence
+            stats = dict(profile.interaction_stats or {})
+            stats["preference_confidence"] = {**stats.get("preference_confidence", {}), **confidences}
             profile.interaction_stats = stats
             profile.updated_at = current_time
         
         self.db.commit()
+        self._invalidate_profile_cache()
     
     async def record_interaction(
         self,
@@ -194,54 +272,94 @@ class UserProfileService:
         context_data: Dict[str, Any] = None
     ):
         """Record a user-agent interaction with enhanced analytics"""
-        # Always use default user ID
-        interaction = SessionInteraction(
-            session_id=session_id,
-            user_input=user_input,
-            agent_response=agent_response,
-            tools_used=tools_used or [],
-            context_data=context_data or {}
-        )
-        self.db.add(interaction)
+        await self.record_interactions(user_id, session_id, [{
+            "user_input": user_input,
+            "agent_response": agent_response,
+            "tools_used": tools_used,
+            "context_data": context_data
+        }])
+    
+    @staticmethod
+    def _interaction_timestamp(value: Any) -> Optional[datetime]:
+        """Parse an interaction's timestamp, given as a datetime or an ISO string"""
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                return None
+        return None
+    
+    async def record_interactions(
+        self,
+        user_id: str,
+        session_id: str,
+        interactions: List[Dict[str, Any]]
+    ):
+        """Record a batch of user-agent interactions with one bulk insert and one stats update"""
+        if not interactions:
+            return
+        
+        # Always use default user ID; interactions buffered by the session service
+        # carry the ISO timestamp of when they happened rather than when they're written
+        now = datetime.now(timezone.utc)
+        bulk_log_interactions(self.db, [
+            {
+                "session_id": session_id,
+                "user_input": interaction.get("user_input"),
+                "agent_response": interaction.get("agent_response"),
+                "timestamp": self._interaction_timestamp(interaction.get("timestamp")) or now,
+                "tools_used": interaction.get("tools_used") or [],
+                "context_data": interaction.get("context_data") or {}
+            }
+            for interaction in interactions
+        ])
         
         # Update user interaction stats with more detailed tracking
         profile = self.db.query(UserProfile).filter(UserProfile.user_id == DEFAULT_USER_ID).first()
         if profile:
-            stats = profile.interaction_stats
-            stats["total_interactions"] = stats.get("total_interactions", 0) + 1
+            # Copy so the reassignment below is picked up as a change to the JSON column
+            stats = dict(profile.interaction_stats or {})
+            stats["total_interactions"] = stats.get("total_interactions", 0) + len(interactions)
             
-            # Track tool usage patterns
-            if tools_used:
-                preferred_tools = stats.get("preferred_tools", {})
-                for tool in tools_used:
-                    preferred_tools[tool] = preferred_tools.get(tool, 0) + 1
-                stats["preferred_tools"] = preferred_tools
-            
-            # Track common topics
-            if context_data and "topics" in context_data:
-                common_topics = stats.get("common_topics", {})
-                for topic in context_data["topics"]:
-                    common_topics[topic] = common_topics.get(topic, 0) + 1
-                stats["common_topics"] = dict(sorted(
-                    common_topics.items(),
-                    key=lambda x: x[1],
-                    reverse=True
-                )[:20])  # Keep top 20 topics
-            
-            # Update average session length
-            if "session_duration" in context_data:
-                current_avg = stats.get("avg_session_length", 0)
-                total_sessions = stats.get("total_sessions", 0)
-                stats["avg_session_length"] = (
-                    (current_avg * total_sessions + context_data["session_duration"]) /
-                    (total_sessions + 1)
-                )
+            for interaction in interactions:
+                tools_used = interaction.get("tools_used")
+                context_data = interaction.get("context_data") or {}
+                
+                # Track tool usage patterns
+                if tools_used:
+                    preferred_tools = stats.get("preferred_tools") or {}
+                    for tool in tools_used:
+                        preferred_tools[tool] = preferred_tools.get(tool, 0) + 1
+                    stats["preferred_tools"] = preferred_tools
+                
+                # Track common topics
+                if "topics" in context_data:
+                    common_topics = stats.get("common_topics") or {}
+                    for topic in context_data["topics"]:
+                        common_topics[topic] = common_topics.get(topic, 0) + 1
+                    stats["common_topics"] = dict(sorted(
+                        common_topics.items(),
+                        key=lambda x: x[1],
+                        reverse=True
+                    )[:20])  # Keep top 20 topics
+                
+                # Update average session length
+                if "session_duration" in context_data:
+                    current_avg = stats.get("avg_session_length", 0)
+                    total_sessions = stats.get("total_sessions", 0)
+                    stats["avg_session_length"] = (
+                        (current_avg * total_sessions + context_data["session_duration"]) /
+                        (total_sessions + 1)
+                    )
             
             profile.interaction_stats = stats
-            profile.updated_at = datetime.utcnow()
+            profile.updated_at = datetime.now(timezone.utc)
         
         self.db.commit()
-        self.logger.debug(f"Recorded interaction for default user in session {session_id}")
+        self._invalidate_profile_cache()
+        self.logger.debug(f"Recorded {len(interactions)} interactions for default user in session {session_id}")
     
     async def add_life_event(
         self,
@@ -258,9 +376,9 @@ class UserProfileService:
             user_id=DEFAULT_USER_ID,
             event_type=event_type,
             event_data=event_data,
-            event_date=event_date or datetime.utcnow(),
+            event_date=event_date or datetime.now(timezone.utc),
             importance_score=importance_score,
-            tags=tags or []
+            tags=get_or_create_tags(self.db, tags or [])
         )
         self.db.add(life_event)
         
@@ -271,7 +389,7 @@ class UserProfileService:
             events = profile.preferences.get("significant_events", [])
             events.append({
                 "type": event_type,
-                "date": event_date.isoformat() if event_date else datetime.utcnow().isoformat(),
+                "date": event_date.isoformat() if event_date else datetime.now(timezone.utc).isoformat(),
                 "importance": importance_score,
                 "tags": tags
             })
@@ -281,9 +399,10 @@ class UserProfileService:
                 reverse=True
             )[:10]  # Keep top 10 significant events
             
-            profile.updated_at = datetime.utcnow()
+            profile.updated_at = datetime.now(timezone.utc)
             
         self.db.commit()
+        self._invalidate_profile_cache()
         self.logger.info(f"Added life event {event_type} for default user")
     
     async def get_life_events(
@@ -294,7 +413,9 @@ class UserProfileService:
     ) -> List[Dict[str, Any]]:
         """Get user's life events"""
         # Always use default user ID
-        query = self.db.query(LifeEvent).filter(LifeEvent.user_id == DEFAULT_USER_ID)
+        query = self.db.query(LifeEvent).options(selectinload(LifeEvent.tags)).filter(
+            LifeEvent.user_id == DEFAULT_USER_ID
+        )
         
         if event_type:
             query = query.filter(LifeEvent.event_type == event_type)
@@ -308,7 +429,7 @@ class UserProfileService:
                 "event_data": event.event_data,
                 "event_date": event.event_date,
                 "importance_score": event.importance_score,
-                "tags": event.tags,
+                "tags": [tag.name for tag in event.tags],
                 "created_at": event.created_at
             }
             for event in events
@@ -338,7 +459,7 @@ class UserProfileService:
                         style_history[key].append({
                             "old_value": old_value,
                             "new_value": new_value,
-                            "timestamp": datetime.utcnow().isoformat()
+                            "timestamp": datetime.now(timezone.utc).isoformat()
                         })
                         
                         # Keep last 5 changes for each style aspect
@@ -347,8 +468,9 @@ class UserProfileService:
             
             current_style.update(style_updates)
             profile.communication_style = current_style
-            profile.updated_at = datetime.utcnow()
+            profile.updated_at = datetime.now(timezone.utc)
             self.db.commit()
+            self._invalidate_profile_cache()
             self.logger.info(f"Updated communication style for default user")
     
     async def get_session_summary(self, user_id: str, session_id: str) -> Dict[str, Any]:
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tag Backfill Script
+
+One-off migration for databases created before tags moved into the tag link
+tables: links every memory and life event to the tags in its legacy JSON tags
+column. Safe to run more than once.
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    from app.config.database import db_config
+    from app.models.database import backfill_legacy_tags
+
+    # Make sure the tag tables exist before linking into them
+    db_config.create_tables()
+
+    db_session = db_config.SessionLocal()
+    try:
+        linked = backfill_legacy_tags(db_session)
+        db_session.commit()
+        logger.info(f"✅ Linked {linked} legacy tags")
+    except Exception as e:
+        db_session.rollback()
+        logger.error(f"❌ Tag backfill failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        db_session.close()
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,14 @@ import argparse
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 
+# memory_vectors columns in the positional order used below; tags live in the
+# memory_tags join table and are flattened back into a comma-separated string
+TAGS_SQL = """(SELECT GROUP_CONCAT(t.name, ', ') FROM memory_tags mt
+                 JOIN tags t ON t.id = mt.tag_id
+                 WHERE mt.memory_id = memory_vectors.id)"""
+MEMORY_COLUMNS = f"""id, user_id, session_id, content, content_summary, vector_id, memory_type,
+                 importance_score, created_at, last_accessed, access_count, {TAGS_SQL} AS tags"""
+
 class JarvisMemoryChecker:
     def __init__(self, db_path: str = "jarvis_memory.db", show_all: bool = False, full_content: bool = False):
         self.db_path = db_path
@@ -121,7 +129,7 @@ class JarvisMemoryChecker:
         cursor = self.conn.cursor()
         
         try:
-            cursor.execute("SELECT * FROM memory_vectors ORDER BY created_at DESC")
+            cursor.execute(f"SELECT {MEMORY_COLUMNS} FROM memory_vectors ORDER BY created_at DESC")
             memories = cursor.fetchall()
             
             formatted_memories = []
@@ -184,7 +192,7 @@ class JarvisMemoryChecker:
                 })
             
             # Memory vectors
-            cursor.execute("SELECT * FROM memory_vectors WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
+            cursor.execute(f"SELECT {MEMORY_COLUMNS} FROM memory_vectors WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
             memories = cursor.fetchall()
             user_data['memories'] = []
             for memory in memories:
@@ -230,15 +238,15 @@ class JarvisMemoryChecker:
         
         try:
             if user_id:
-                cursor.execute("""
-                    SELECT * FROM memory_vectors 
-                    WHERE user_id = ? AND (content LIKE ? OR tags LIKE ?)
+                cursor.execute(f"""
+                    SELECT {MEMORY_COLUMNS} FROM memory_vectors 
+                    WHERE user_id = ? AND (content LIKE ? OR {TAGS_SQL} LIKE ?)
                     ORDER BY importance_score DESC, created_at DESC
                 """, (user_id, f"%{query}%", f"%{query}%"))
             else:
-                cursor.execute("""
-                    SELECT * FROM memory_vectors 
-                    WHERE content LIKE ? OR tags LIKE ?
+                cursor.execute(f"""
+                    SELECT {MEMORY_COLUMNS} FROM memory_vectors 
+                    WHERE content LIKE ? OR {TAGS_SQL} LIKE ?
                     ORDER BY importance_score DESC, created_at DESC
                 """, (f"%{query}%", f"%{query}%"))
             
@@ -272,11 +280,11 @@ class JarvisMemoryChecker:
         
         try:
             # Recent memories
-            cursor.execute("""
-                SELECT * FROM memory_vectors 
-                WHERE created_at >= date('now', '-{} days')
+            cursor.execute(f"""
+                SELECT {MEMORY_COLUMNS} FROM memory_vectors 
+                WHERE created_at >= date('now', '-{days} days')
                 ORDER BY created_at DESC
-            """.format(days))
+            """)
             
             recent_memories = cursor.fetchall()
             
@@ -0,0 +1,121 @@
+"""Shared fixtures for the SQLite-backed tests"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from app.config.database import DatabaseConfig
+
+# Application tables as the original schema created them, before server defaults,
+# timezone-aware timestamps and the tag link tables were introduced
+LEGACY_SCHEMA = """
+CREATE TABLE user_profiles (
+    user_id VARCHAR NOT NULL,
+    created_at DATETIME,
+    updated_at DATETIME,
+    preferences JSON,
+    interaction_stats JSON,
+    communication_style JSON,
+    PRIMARY KEY (user_id)
+);
+CREATE TABLE session_history (
+    session_id VARCHAR NOT NULL,
+    user_id VARCHAR,
+    created_at DATETIME,
+    ended_at DATETIME,
+    session_summary TEXT,
+    topics_discussed JSON,
+    outcomes JSON,
+    session_metadata JSON,
+    is_active BOOLEAN,
+    PRIMARY KEY (session_id),
+    FOREIGN KEY(user_id) REFERENCES user_profiles (user_id)
+);
+CREATE TABLE user_preferences (
+    id INTEGER NOT NULL,
+    user_id VARCHAR,
+    preference_key VARCHAR,
+    preference_value JSON,
+    confidence_score FLOAT,
+    last_reinforced DATETIME,
+    preference_type VARCHAR,
+    preference_category VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user_profiles (user_id)
+);
+CREATE TABLE life_events (
+    id INTEGER NOT NULL,
+    user_id VARCHAR,
+    event_type VARCHAR,
+    event_data JSON,
+    event_date DATETIME,
+    importance_score FLOAT,
+    created_at DATETIME,
+    tags JSON,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user_profiles (user_id)
+);
+CREATE TABLE session_interactions (
+    id INTEGER NOT NULL,
+    session_id VARCHAR,
+    user_input TEXT,
+    agent_response TEXT,
+    timestamp DATETIME,
+    tools_used JSON,
+    context_data JSON,
+    PRIMARY KEY (id),
+    FOREIGN KEY(session_id) REFERENCES session_history (session_id)
+);
+CREATE TABLE memory_vectors (
+    id INTEGER NOT NULL,
+    user_id VARCHAR,
+    session_id VARCHAR,
+    content TEXT,
+    content_summary TEXT,
+    vector_id VARCHAR,
+    memory_type VARCHAR,
+    importance_score FLOAT,
+    created_at DATETIME,
+    last_accessed DATETIME,
+    access_count INTEGER,
+    tags JSON,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user_profiles (user_id),
+    FOREIGN KEY(session_id) REFERENCES session_history (session_id)
+);
+"""
+
+
+@pytest.fixture
+def db_config():
+    """Database with the current schema, in memory"""
+    config = DatabaseConfig("sqlite://")
+    config.create_tables()
+    yield config
+    config.engine.dispose()
+
+
+@pytest.fixture
+def legacy_db_config(tmp_path):
+    """Database whose application tables were created by the original schema"""
+    config = DatabaseConfig(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with config.engine.begin() as connection:
+        for statement in LEGACY_SCHEMA.split(";"):
+            if statement.strip():
+                connection.execute(text(statement))
+    config.create_tables()
+    yield config
+    config.engine.dispose()
+
+
+@pytest.fixture
+def db_session(db_config):
+    session = db_config.SessionLocal()
+    yield session
+    session.close()
@@ -0,0 +1,152 @@
+"""Tests for the database models and helpers, against SQLite"""
+
+from datetime import timezone
+
+from sqlalchemy import DateTime, func, null, select, text, update
+from sqlalchemy.orm import selectinload
+
+from app.models.database import (
+    Base,
+    MemoryVector,
+    SessionHistory,
+    SessionInteraction,
+    Tag,
+    UserProfile,
+    backfill_legacy_tags,
+    get_or_create_tags,
+    json_merge,
+    memory_tags,
+)
+
+
+class TestLegacySchema:
+    """Tables created before the current schema are left as they were by create_tables"""
+
+    def test_timestamps_filled_in_without_server_defaults(self, legacy_db_config):
+        session = legacy_db_config.SessionLocal()
+        try:
+            session.add(UserProfile(user_id="legacy_user"))
+            session.add(SessionHistory(session_id="legacy_session", user_id="legacy_user"))
+            session.add(SessionInteraction(session_id="legacy_session", user_input="hi"))
+            session.add(MemoryVector(user_id="legacy_user", vector_id="v1", content="A memory"))
+            session.commit()
+
+            profile = session.get(UserProfile, "legacy_user")
+            assert profile.created_at is not None
+            assert profile.updated_at is not None
+            assert session.get(SessionHistory, "legacy_session").created_at is not None
+            assert session.query(SessionInteraction).one().timestamp is not None
+
+            memory = session.query(MemoryVector).one()
+            assert memory.created_at is not None
+            assert memory.last_accessed is not None
+        finally:
+            session.close()
+
+
+class TestTimestamps:
+    """Python-side timestamp defaults"""
+
+    def test_defaults_are_aware_utc(self):
+        # Postgres reads naive values in the server's time zone, not UTC
+        columns = [
+            column for table in Base.metadata.sorted_tables for column in table.columns
+            if isinstance(column.type, DateTime) and column.default is not None
+        ]
+        assert len(columns) == 8
+        for column in columns:
+            assert column.default.arg(None).tzinfo is timezone.utc, column
+
+
+class TestTags:
+    """Tag upserts and the legacy JSON tags backfill"""
+
+    def test_get_or_create_tags_reuses_existing_rows(self, db_session):
+        first = get_or_create_tags(db_session, ["work", " travel ", "work"])
+        db_session.commit()
+
+        second = get_or_create_tags(db_session, ["travel", "family"])
+
+        assert [tag.name for tag in first] == ["work", "travel"]
+        assert [tag.name for tag in second] == ["travel", "family"]
+        assert second[0].id == first[1].id
+        assert db_session.scalar(select(func.count()).select_from(Tag)) == 3
+
+    def test_get_or_create_tags_ignores_rows_added_by_another_writer(self, db_config):
+        session = db_config.SessionLocal()
+        other = db_config.SessionLocal()
+        try:
+            other.add(Tag(name="work"))
+            other.commit()
+
+            tags = get_or_create_tags(session, ["work", "travel"])
+            session.commit()
+
+            assert [tag.name for tag in tags] == ["work", "travel"]
+            assert session.scalar(select(func.count()).select_from(Tag)) == 2
+        finally:
+            session.close()
+            other.close()
+
+    def test_backfill_links_legacy_json_tags(self, legacy_db_config):
+        with legacy_db_config.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO memory_vectors (id, user_id, content, tags) VALUES "
+                "(1, 'legacy_user', 'first', '\"setup,test\"'), "
+                "(2, 'legacy_user', 'second', '[\"test\", \"calendar\"]'), "
+                "(3, 'legacy_user', 'third', NULL)"
+            ))
+
+        session = legacy_db_config.SessionLocal()
+        try:
+            assert backfill_legacy_tags(session) == 4
+            session.commit()
+            # Running again links nothing new
+            backfill_legacy_tags(session)
+            session.commit()
+
+            memories = session.scalars(
+                select(MemoryVector).options(selectinload(MemoryVector.tags)).order_by(MemoryVector.id)
+            ).all()
+            assert [sorted(tag.name for tag in memory.tags) for memory in memories] == [
+                ["setup", "test"], ["calendar", "test"], []
+            ]
+            assert session.scalar(select(func.count()).select_from(memory_tags)) == 4
+        finally:
+            session.close()
+
+
+class TestJsonMerge:
+    """Merging keys into a JSON column in the UPDATE itself"""
+
+    def _merge(self, session, metadata):
+        session.execute(
+            update(SessionHistory)
+            .where(SessionHistory.session_id == "session_1")
+            .values(session_metadata=json_merge(SessionHistory.session_metadata, metadata))
+        )
+        session.commit()
+        session.expire_all()
+        return session.get(SessionHistory, "session_1").session_metadata
+
+    def test_merges_keys_and_nested_objects(self, db_session):
+        db_session.add(SessionHistory(session_id="session_1", session_metadata={"a": 1, "nested": {"x": 1}}))
+        db_session.commit()
+
+        assert self._merge(db_session, {"b": 2, "nested": {"y": 2}}) == {
+            "a": 1, "b": 2, "nested": {"x": 1, "y": 2}
+        }
+
+    def test_merges_into_null_column(self, db_session):
+        db_session.add(SessionHistory(session_id="session_1"))
+        db_session.execute(update(SessionHistory).values(session_metadata=null()))
+        db_session.commit()
+
+        assert self._merge(db_session, {"a": 1}) == {"a": 1}
+
+    def test_null_values_remove_keys_on_sqlite(self, db_session):
+        # A JSON merge patch deletes keys set to null, unlike Postgres' || operator
+        db_session.add(SessionHistory(session_id="session_1", session_metadata={"a": 1, "b": 2}))
+        db_session.commit()
+
+        assert self._merge(db_session, {"a": None}) == {"b": 2}
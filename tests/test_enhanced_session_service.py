@@ -0,0 +1,241 @@
+"""Tests for the enhanced session service, against SQLite"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config.constants import APP_NAME, DEFAULT_USER_ID
+from app.models.database import SessionHistory, SessionInteraction
+from app.services.enhanced_session_service import EnhancedSessionService, _uuid7
+from app.services.memory_service import memory_content_hash
+from app.services.user_profile_service import UserProfileService
+
+
+class RecordingMemoryService:
+    """Memory service double that records what the session service stores"""
+
+    def __init__(self):
+        self.session_memories = []
+        self.stored_memories = []
+        # Bulk stores to fail, as store_memories_bulk does, by storing nothing
+        self.failing_stores = 0
+        self.memory_hashes = {}
+        # Cleared to hold end-of-session memory capture until set again
+        self.release_session_memory = asyncio.Event()
+        self.release_session_memory.set()
+
+    async def get_contextual_memories(self, **kwargs):
+        return {"relevant_memories": [], "context_summary": ""}
+
+    async def list_memory_hashes(self, user_id, memory_types):
+        return {memory_type: self.memory_hashes.setdefault(memory_type, set()) for memory_type in memory_types}
+
+    async def search_memories(self, **kwargs):
+        return []
+
+    async def store_memories_bulk(self, user_id, memories):
+        if self.failing_stores:
+            self.failing_stores -= 1
+            return []
+        self.stored_memories.extend(memories)
+        for memory in memories:
+            if memory["memory_type"] in self.memory_hashes:
+                self.memory_hashes[memory["memory_type"]].add(memory_content_hash(memory["content"]))
+        return [f"memory_{i}" for i in range(len(memories))]
+
+    async def store_session_memory(self, **kwargs):
+        await self.release_session_memory.wait()
+        self.session_memories.append(kwargs)
+        return "session_memory"
+
+
+@pytest.fixture
+def memory_service():
+    return RecordingMemoryService()
+
+
+@pytest.fixture
+def session_service(db_session, memory_service):
+    return EnhancedSessionService(
+        db_url="sqlite://",
+        db_session=db_session,
+        user_profile_service=UserProfileService(db_session),
+        memory_service=memory_service
+    )
+
+
+class TestIdleSessions:
+    """Ending sessions nobody has used for ACTIVE_SESSION_TTL"""
+
+    @pytest.mark.asyncio
+    async def test_new_session_does_not_wait_for_idle_sessions_to_end(self, session_service, memory_service):
+        idle = await session_service.create_session_with_context(DEFAULT_USER_ID, APP_NAME)
+        session_service.active_sessions[idle.id]["last_activity"] -= session_service.ACTIVE_SESSION_TTL + 1
+
+        memory_service.release_session_memory.clear()
+        new = await asyncio.wait_for(
+            session_service.create_session_with_context(DEFAULT_USER_ID, APP_NAME), timeout=5
+        )
+
+        assert new.id in session_service.active_sessions
+        assert idle.id in session_service.active_sessions
+
+        memory_service.release_session_memory.set()
+        await session_service._idle_sweep
+        assert idle.id not in session_service.active_sessions
+        assert new.id in session_service.active_sessions
+        assert len(memory_service.session_memories) == 1
+
+
+class TestInteractionQueue:
+    """Background preference learning and contextual memory"""
+
+    def test_queue_follows_the_running_event_loop(self, session_service, memory_service):
+        async def queue_and_drain(user_input):
+            session_service._queue_interaction("session_1", {
+                "user_input": user_input,
+                "agent_response": "Noted.",
+                "tools_used": [],
+                "timestamp": "2026-01-02T03:04:05+00:00",
+                "importance_score": 0.8,
+            })
+            await asyncio.wait_for(session_service._memory_queue.join(), timeout=5)
+
+        # Each asyncio.run is a new event loop, as with separate test cases or workers
+        asyncio.run(queue_and_drain("My name is Tony"))
+        asyncio.run(queue_and_drain("I work at Stark Industries"))
+
+        assert [memory["content"] for memory in memory_service.stored_memories] == [
+            "My name is Tony", "I work at Stark Industries"
+        ]
+
+
+class TestUuid7:
+    """Time-ordered session IDs"""
+
+    def test_version_variant_and_timestamp(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid.UUID(_uuid7())
+        after = time.time_ns() // 1_000_000
+
+        assert value.version == 7
+        assert value.variant == uuid.RFC_4122
+        assert before <= value.int >> 80 <= after
+
+    def test_ids_sort_in_creation_order(self):
+        ids = []
+        for _ in range(5):
+            ids.append(_uuid7())
+            time.sleep(0.002)
+
+        assert sorted(ids) == ids
+        assert len(set(ids)) == len(ids)
+
+
+class TestSessionHistory:
+    """Session history rows written with a single statement each"""
+
+    def test_save_creates_then_merges_metadata(self, session_service, db_session):
+        now = datetime.now(timezone.utc)
+        session_service._save_session_history("session_1", now, {"app_name": "jarvis", "count": 1})
+        session_service._save_session_history("session_1", now, {"count": 2})
+
+        history = db_session.get(SessionHistory, "session_1")
+        assert history.is_active
+        assert history.user_id == DEFAULT_USER_ID
+        assert history.session_metadata == {"app_name": "jarvis", "count": 2}
+
+    def test_update_returns_the_closed_row(self, session_service):
+        now = datetime.now(timezone.utc)
+        session_service._save_session_history("session_1", now, {"app_name": "jarvis"})
+
+        history = session_service._update_session_history("session_1", {
+            "summary": "Session with 2 interactions",
+            "topics": ["calendar"],
+            "outcomes": ["Calendar management"],
+            "total_interactions": 2,
+            "session_duration": 30,
+            "tools_effectiveness": {"calendar": 0.6},
+        }, now)
+
+        assert history["session_id"] == "session_1"
+        assert history["is_active"] is False
+        assert history["ended_at"] is not None
+        assert history["session_summary"] == "Session with 2 interactions"
+        assert history["topics_discussed"] == ["calendar"]
+        assert history["session_metadata"] == {
+            "app_name": "jarvis",
+            "total_interactions": 2,
+            "session_duration": 30,
+            "tools_effectiveness": {"calendar": 0.6},
+        }
+
+    def test_update_of_unknown_session_returns_none(self, session_service):
+        insights = {
+            "summary": "", "topics": [], "outcomes": [],
+            "total_interactions": 0, "session_duration": 0, "tools_effectiveness": {},
+        }
+        assert session_service._update_session_history("missing", insights, datetime.now(timezone.utc)) is None
+
+
+class TestInteractionBuffer:
+    """Interactions buffered per session, spilled to the database when the buffer fills"""
+
+    @pytest.mark.asyncio
+    async def test_spills_older_half_and_keeps_running_counters(self, session_service, db_session):
+        session = await session_service.create_session_with_context(DEFAULT_USER_ID, APP_NAME)
+        session_data = session_service.active_sessions[session.id]
+        size = session_service.INTERACTION_BUFFER_SIZE
+
+        recorded = []
+        for i in range(size):
+            await session_service.update_session_context(
+                session.id, {},
+                user_input=f"Please schedule meeting {i}",
+                agent_response=f"I have created meeting {i}",
+                tools_used=["calendar"] if i % 2 else ["email"]
+            )
+            recorded.append(session_data["interactions"][-1])
+
+        assert len(session_data["interactions"]) == size // 2
+        assert session_data["interactions_recorded"] == size // 2
+        assert db_session.query(SessionInteraction).filter_by(session_id=session.id).count() == size // 2
+
+        # A partial update replaces the last interaction's share of the counters
+        await session_service.update_session_context(session.id, {}, agent_response="Sent it", tools_used=["email"])
+
+        assert session_data["tool_importance_count"] == {"calendar": size // 2 - 1, "email": size // 2 + 1}
+        assert session_data["high_importance_count"] == sum(i["importance_score"] > 0.7 for i in recorded)
+
+        insights = session_service._extract_session_insights(session_data)
+        assert insights["total_interactions"] == size
+        for tool in ("calendar", "email"):
+            assert insights["tools_effectiveness"][tool] == pytest.approx(
+                sum(i["importance_score"] for i in recorded if tool in i["tools_used"])
+                / sum(tool in i["tools_used"] for i in recorded)
+            )
+
+
+class TestContextualMemory:
+    """Facts and preferences extracted from interactions"""
+
+    @pytest.mark.asyncio
+    async def test_fact_stored_once_the_store_succeeds(self, session_service, memory_service):
+        session = await session_service.create_session_with_context(DEFAULT_USER_ID, APP_NAME)
+        interaction = {
+            "user_input": "I live in Malibu",
+            "agent_response": "Noted.",
+            "tools_used": [],
+            "importance_score": 0.8,
+        }
+
+        memory_service.failing_stores = 1
+        await session_service._update_contextual_memory(session.id, DEFAULT_USER_ID, interaction)
+        assert memory_service.stored_memories == []
+
+        await session_service._update_contextual_memory(session.id, DEFAULT_USER_ID, interaction)
+        await session_service._update_contextual_memory(session.id, DEFAULT_USER_ID, interaction)
+        assert [memory["content"] for memory in memory_service.stored_memories] == ["I live in Malibu"]
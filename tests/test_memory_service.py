@@ -0,0 +1,306 @@
+"""Tests for the memory service, against SQLite and a local ChromaDB"""
+
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import chromadb
+import numpy as np
+import pytest
+
+from app.services import memory_service as memory_module
+from app.services.memory_service import JarvisMemoryService, memory_content_hash
+
+
+def _text_vector(text: str) -> np.ndarray:
+    """Deterministic pseudo-random vector for a text"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+    return np.random.default_rng(seed).standard_normal(768)
+
+
+class FakeEmbeddingModel:
+    """Stand-in for the Vertex AI embedding model, recording the texts of each request"""
+
+    def __init__(self):
+        self.requests = []
+        # Texts embedded as a given vector instead of a pseudo-random one
+        self.vectors = {}
+
+    async def get_embeddings_async(self, inputs):
+        texts = [embedding_input.text for embedding_input in inputs]
+        self.requests.append(texts)
+        return [
+            SimpleNamespace(values=list(self.vectors.get(text, _text_vector(text))))
+            for text in texts
+        ]
+
+
+@pytest.fixture
+def embedding_model():
+    return FakeEmbeddingModel()
+
+
+@pytest.fixture
+def memory_service(db_session, embedding_model, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        memory_module.chromadb, "Client",
+        lambda settings: chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    )
+    monkeypatch.setattr(memory_module.vertexai, "init", lambda **kwargs: None)
+    monkeypatch.setattr(memory_module.TextEmbeddingModel, "from_pretrained", lambda name: embedding_model)
+    # Shared across instances, so one test's embeddings mustn't leak into the next
+    JarvisMemoryService._embedding_cache.clear()
+
+    service = JarvisMemoryService(db_session)
+    yield service
+    service._chroma_pool.shutdown()
+
+
+class TestStoreBatching:
+    """store_memory calls coalesced into bulk stores"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_stores_share_one_bulk_store(self, memory_service, monkeypatch):
+        batches = []
+        store_memories_bulk = memory_service.store_memories_bulk
+
+        async def recording_store(user_id, memories):
+            batches.append(len(memories))
+            return await store_memories_bulk(user_id, memories)
+
+        monkeypatch.setattr(memory_service, "store_memories_bulk", recording_store)
+
+        memory_ids = await asyncio.gather(*(
+            memory_service.store_memory("user", f"Memory number {i}", memory_type="fact")
+            for i in range(5)
+        ))
+
+        assert batches == [5]
+        assert len(set(memory_ids)) == 5 and None not in memory_ids
+
+    def test_queue_follows_the_running_event_loop(self, memory_service, monkeypatch):
+        async def fake_store(user_id, memories):
+            return [memory["content"] for memory in memories]
+
+        monkeypatch.setattr(memory_service, "store_memories_bulk", fake_store)
+
+        # Each asyncio.run is a new event loop, as with separate test cases or workers
+        first = asyncio.run(memory_service.store_memory("user", "Stored on the first loop"))
+        second = asyncio.run(asyncio.wait_for(
+            memory_service.store_memory("user", "Stored on the second loop"), timeout=5
+        ))
+
+        assert first == "Stored on the first loop"
+        assert second == "Stored on the second loop"
+
+    @pytest.mark.asyncio
+    async def test_callers_answered_when_the_worker_is_cancelled(self, memory_service):
+        # Long enough that the worker is still collecting the batch when cancelled
+        memory_service.STORE_BATCH_WINDOW = 10
+
+        stored = asyncio.create_task(memory_service.store_memory("user", "Never stored"))
+        await asyncio.sleep(0)
+        while memory_service._store_queue.qsize():
+            await asyncio.sleep(0)
+        memory_service._store_worker.cancel()
+
+        assert await asyncio.wait_for(stored, timeout=5) is None
+
+        # The next call starts a new worker
+        memory_service.STORE_BATCH_WINDOW = 0
+        assert await asyncio.wait_for(memory_service.store_memory("user", "Stored after all"), timeout=5) is not None
+
+
+class TestEmbeddingBatching:
+    """Texts from concurrent callers embedded together"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_request(self, memory_service, embedding_model):
+        first, second = await asyncio.gather(
+            memory_service._get_embeddings(["alpha text", "beta text"]),
+            memory_service._get_embeddings(["beta text", "gamma text"]),
+        )
+
+        assert embedding_model.requests == [["alpha text", "beta text", "gamma text"]]
+        assert np.array_equal(first[1], second[0])
+        assert np.linalg.norm(first, axis=1) == pytest.approx([1, 1])
+        assert not memory_service._pending_embeddings
+
+    def test_queue_follows_the_running_event_loop(self, memory_service):
+        # Each asyncio.run is a new event loop, as with separate test cases or workers
+        first = asyncio.run(memory_service._get_embedding("embedded on the first loop"))
+        second = asyncio.run(asyncio.wait_for(
+            memory_service._get_embedding("embedded on the second loop"), timeout=5
+        ))
+
+        assert np.any(first)
+        assert np.any(second)
+
+    @pytest.mark.asyncio
+    async def test_texts_requested_again_after_the_worker_is_cancelled(self, memory_service, embedding_model):
+        # Long enough that the worker is still collecting the batch when cancelled
+        memory_service.EMBEDDING_BATCH_WINDOW = 10
+
+        embedding = asyncio.create_task(memory_service._get_embedding("cancelled text"))
+        await asyncio.sleep(0)
+        while memory_service._embedding_queue.qsize():
+            await asyncio.sleep(0)
+        memory_service._embedding_worker.cancel()
+
+        assert not np.any(await asyncio.wait_for(embedding, timeout=5))
+        assert not memory_service._pending_embeddings
+
+        memory_service.EMBEDDING_BATCH_WINDOW = 0
+        embedding = await asyncio.wait_for(memory_service._get_embedding("cancelled text"), timeout=5)
+        assert np.any(embedding)
+        assert embedding_model.requests == [["cancelled text"]]
+
+
+class TestSearchCache:
+    """search_memories answers repeated and near-identical queries from memory"""
+
+    @pytest.fixture
+    def chroma_queries(self, memory_service, monkeypatch):
+        queries = []
+        run_chroma = memory_service._run_chroma
+
+        async def recording_run_chroma(method, **kwargs):
+            if method == memory_service.collection.query:
+                queries.append(kwargs["query_embeddings"])
+            return await run_chroma(method, **kwargs)
+
+        monkeypatch.setattr(memory_service, "_run_chroma", recording_run_chroma)
+        return queries
+
+    @pytest.fixture(autouse=True)
+    def meeting_vectors(self, embedding_model):
+        # Queries and memories about meetings embed close together
+        base = _text_vector("meetings")
+        for text in (
+            "what meetings do I have",
+            "which meetings do I have",
+            "Weekly meeting with the design team",
+            "Monthly meeting with finance",
+        ):
+            embedding_model.vectors[text] = base + 0.05 * _text_vector(text)
+
+    @pytest.mark.asyncio
+    async def test_near_identical_query_shares_cached_results(self, memory_service, chroma_queries):
+        await memory_service.store_memory("user", "Weekly meeting with the design team", memory_type="fact")
+        chroma_queries.clear()  # Storing looks up related memories
+
+        first = await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+        repeated = await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+        similar = await memory_service.search_memories("user", "which meetings do I have", memory_type="fact")
+
+        assert len(chroma_queries) == 1
+        assert [memory["content"] for memory in first] == ["Weekly meeting with the design team"]
+        assert repeated == first
+        assert similar == first
+        # Results are copies, so callers can't change what later searches get
+        similar[0]["content"] = "changed"
+        assert (await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")) == first
+
+    @pytest.mark.asyncio
+    async def test_different_query_or_filters_miss(self, memory_service, chroma_queries):
+        await memory_service.store_memory("user", "Weekly meeting with the design team", memory_type="fact")
+        chroma_queries.clear()  # Storing looks up related memories
+
+        for query, memory_type in (
+            ("what meetings do I have", "fact"),
+            ("where do I live", "fact"),
+            ("what meetings do I have", "preference"),
+        ):
+            queried = len(chroma_queries)
+            await memory_service.search_memories("user", query, memory_type=memory_type)
+            assert len(chroma_queries) > queried
+
+    @pytest.mark.asyncio
+    async def test_storing_clears_the_cache(self, memory_service, chroma_queries):
+        await memory_service.store_memory("user", "Weekly meeting with the design team", memory_type="fact")
+        chroma_queries.clear()  # Storing looks up related memories
+        await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+
+        await memory_service.store_memory("user", "Monthly meeting with finance", memory_type="fact")
+        chroma_queries.clear()
+        results = await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+
+        assert len(chroma_queries) == 1
+        assert len(results) == 2
+
+    @pytest.mark.asyncio
+    async def test_search_overlapping_a_store_is_not_cached(self, memory_service, monkeypatch):
+        await memory_service.store_memory("user", "Weekly meeting with the design team", memory_type="fact")
+
+        queries = []
+        run_chroma = memory_service._run_chroma
+
+        async def store_during_first_search(method, **kwargs):
+            result = await run_chroma(method, **kwargs)
+            # The search's own query; storing looks up related memories with fewer results
+            if method == memory_service.collection.query and kwargs.get("n_results") == 20:
+                queries.append(kwargs)
+                if len(queries) == 1:
+                    # Stored after the search queried the collection, before it returns
+                    await memory_service.store_memories_bulk("user", [
+                        {"content": "Monthly meeting with finance", "memory_type": "fact"}
+                    ])
+            return result
+
+        monkeypatch.setattr(memory_service, "_run_chroma", store_during_first_search)
+
+        first = await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+        second = await memory_service.search_memories("user", "what meetings do I have", memory_type="fact")
+
+        assert len(first) == 1
+        assert len(queries) == 2
+        assert len(second) == 2
+
+
+class TestContextualMemories:
+    """Memories relevant to the current conversation"""
+
+    @pytest.mark.asyncio
+    async def test_duplicates_dont_reduce_the_count(self, memory_service, embedding_model):
+        query = "what meetings do I have"
+        search_query = f"{query} user asked about {query} information about {query}"
+        contents = ["Weekly meeting with the design team"] * 3 + [
+            "Monthly meeting with finance",
+            "Daily standup at nine",
+        ]
+        base = _text_vector("meetings")
+        embedding_model.vectors[search_query] = base
+        for rank, content in enumerate(dict.fromkeys(contents)):
+            # The duplicated memory is the most relevant
+            embedding_model.vectors[content] = base + 0.05 * (rank + 1) * _text_vector(content)
+        await memory_service.store_memories_bulk("user", [
+            {"content": content, "memory_type": "conversation"} for content in contents
+        ])
+
+        context = await memory_service.get_contextual_memories(
+            "user", {"query": query}, max_memories=3
+        )
+
+        assert [memory["content"] for memory in context["relevant_memories"]] == list(dict.fromkeys(contents))
+        assert context["memory_count"] == 3
+
+
+class TestMemoryHashes:
+    """Hashes of stored contents, for duplicate checks"""
+
+    @pytest.mark.asyncio
+    async def test_loaded_once_then_kept_up_to_date_by_stores(self, memory_service, db_session, monkeypatch):
+        await memory_service.store_memory("user", "I live in Malibu", memory_type="fact")
+
+        hashes = await memory_service.list_memory_hashes("user", ["fact", "preference"])
+        assert hashes == {"fact": {memory_content_hash("I live in Malibu")}, "preference": set()}
+
+        queries = []
+        monkeypatch.setattr(db_session, "execute", lambda *args, **kwargs: queries.append(args))
+        await memory_service.list_memory_hashes("user", ["fact", "preference"])
+        assert queries == []
+        monkeypatch.undo()
+
+        await memory_service.store_memory("user", "I like short answers", memory_type="preference")
+        assert hashes["preference"] == {memory_content_hash("I like short answers")}
@@ -0,0 +1,77 @@
+"""Tests for the user profile service, against SQLite"""
+
+from datetime import datetime
+
+import pytest
+
+from app.config.constants import DEFAULT_USER_ID
+from app.models.database import SessionHistory, SessionInteraction, UserPreference, UserProfile
+from app.services.user_profile_service import UserProfileService
+
+
+@pytest.fixture
+def profile_service(db_session):
+    db_session.add(SessionHistory(session_id="session_1", user_id=DEFAULT_USER_ID))
+    db_session.commit()
+    return UserProfileService(db_session)
+
+
+class TestRecordInteractions:
+    """Batched interaction logging"""
+
+    @pytest.mark.asyncio
+    async def test_keeps_each_interaction_timestamp(self, profile_service, db_session):
+        await profile_service.record_interactions(DEFAULT_USER_ID, "session_1", [
+            {"user_input": "first", "agent_response": "one", "timestamp": "2026-01-02T03:04:05+00:00"},
+            {"user_input": "second", "agent_response": "two", "timestamp": "2026-01-02T03:09:00+00:00"},
+        ])
+        db_session.commit()
+
+        rows = db_session.query(SessionInteraction).order_by(SessionInteraction.id).all()
+        assert [row.timestamp.replace(tzinfo=None) for row in rows] == [
+            datetime(2026, 1, 2, 3, 4, 5),
+            datetime(2026, 1, 2, 3, 9, 0),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_defaults_missing_timestamp(self, profile_service, db_session):
+        await profile_service.record_interactions(DEFAULT_USER_ID, "session_1", [
+            {"user_input": "no timestamp", "agent_response": "ok"},
+        ])
+        db_session.commit()
+
+        assert db_session.query(SessionInteraction).one().timestamp is not None
+
+
+class TestProfileCache:
+    """Profiles served from memory for PROFILE_CACHE_TTL"""
+
+    @pytest.mark.asyncio
+    async def test_cached_profile_is_detached_from_the_row(self, profile_service, db_session):
+        profile, _ = await profile_service.get_profile_and_preferences(DEFAULT_USER_ID)
+
+        assert type(profile["preferences"]) is dict
+        assert type(profile["communication_style"]) is dict
+
+        profile["preferences"]["response_length"] = "changed by a caller"
+        db_session.commit()
+        db_session.expire_all()
+
+        row = db_session.get(UserProfile, DEFAULT_USER_ID)
+        assert row.preferences["response_length"] != "changed by a caller"
+
+
+class TestUpdatePreferences:
+    """Batched preference updates"""
+
+    @pytest.mark.asyncio
+    async def test_reinforces_preference_loaded_from_the_database(self, profile_service, db_session):
+        await profile_service.update_preferences(DEFAULT_USER_ID, [{"key": "tone", "value": "casual", "confidence": 0.5}])
+        # SQLite loads the stored timestamp back as a naive datetime
+        db_session.expire_all()
+
+        await profile_service.update_preferences(DEFAULT_USER_ID, [{"key": "tone", "value": "casual", "confidence": 0.5}])
+
+        preference = db_session.query(UserPreference).filter_by(preference_key="tone").one()
+        assert preference.confidence_score == pytest.approx(0.5)
+        assert preference.last_reinforced is not None